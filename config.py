@@ -14,9 +14,19 @@ class Config:
     WTF_CSRF_SECRET_KEY = environ.get("WTF_CSRF_SECRET_KEY")
 
     REPOSITORY = environ.get('REPOSITORY')
+    # Processes used to parse games.csv, 1 parses it in the web process
+    CSV_READER_PROCESSES = int(environ.get('CSV_READER_PROCESSES', 1))
+    # Memory repository only: read game descriptions and screenshots from games.csv when they are shown
+    LAZY_GAME_DETAILS = environ.get('LAZY_GAME_DETAILS', 'False').lower().strip() == 'true'
     # Database configuration
     SQLALCHEMY_DATABASE_URI = environ.get('SQLALCHEMY_DATABASE_URI')
     echo_string = environ.get('SQLALCHEMY_ECHO')
     SQLALCHEMY_ECHO = False
     if echo_string.lower().strip() == "true":
-        SQLALCHEMY_ECHO = True
\ No newline at end of file
+        SQLALCHEMY_ECHO = True
+
+    # Connection pool: 'queue', 'static' or 'null'
+    SQLALCHEMY_POOL = environ.get('SQLALCHEMY_POOL', 'queue')
+    SQLALCHEMY_POOL_SIZE = int(environ.get('SQLALCHEMY_POOL_SIZE', 5))
+    SQLALCHEMY_MAX_OVERFLOW = int(environ.get('SQLALCHEMY_MAX_OVERFLOW', 10))
+    SQLALCHEMY_POOL_RECYCLE = int(environ.get('SQLALCHEMY_POOL_RECYCLE', -1))
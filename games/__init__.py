@@ -3,15 +3,18 @@ from pathlib import Path
 import config
 
 # imports from SQLAlchemy
-from sqlalchemy import create_engine, inspect
-from sqlalchemy.orm import sessionmaker, clear_mappers
-from sqlalchemy.pool import NullPool
+from sqlalchemy import inspect
+from sqlalchemy.orm import sessionmaker
 
 import games.adapters.repository as repo
 from games.adapters.database_repository import SqlAlchemyRepository
+from games.adapters.database_engine import create_database_engine
 from games.adapters.memory_repository import MemoryRepository
 from games.adapters.repository_populate import populate
-from games.adapters.orm import metadata, map_model_to_tables
+from games.adapters.orm import (
+    metadata, map_model_to_tables, unmap_model, create_games_fts, add_release_ordinal_column, add_rating_aggregate_columns,
+    create_missing_indexes
+)
 from games.adapters.memory_repository import populate2
 
 
@@ -34,7 +37,8 @@ def create_app(test_config=None):
         database_mode = False
         data_path = Path('games') / 'adapters' / 'data'
         # populate(data_path, repo.repo_instance, database_mode)
-        populate2(repo.repo_instance)
+        populate2(repo.repo_instance, processes=app.config['CSV_READER_PROCESSES'],
+                  lazy_details=app.config['LAZY_GAME_DETAILS'])
 
     elif app.config['REPOSITORY'] == 'database':
 
@@ -43,24 +47,47 @@ def create_app(test_config=None):
         app.config['SQLALCHEMY_ECHO'] = True  # echo SQL statements - useful for debugging
 
         # Setup database with SQLAlchemy
-        database_engine = create_engine(database_uri, connect_args={"check_same_thread": False}, poolclass=NullPool,
-                                        echo=False)
+        database_engine = create_database_engine(database_uri,
+                                                 pool=app.config['SQLALCHEMY_POOL'],
+                                                 pool_size=app.config['SQLALCHEMY_POOL_SIZE'],
+                                                 max_overflow=app.config['SQLALCHEMY_MAX_OVERFLOW'],
+                                                 pool_recycle=app.config['SQLALCHEMY_POOL_RECYCLE'],
+                                                 echo=False)
         session_factory = sessionmaker(autocommit=False, autoflush=True, bind=database_engine)
         repo.repo_instance = SqlAlchemyRepository(session_factory)
 
+        # Each request gets its own session, so loaded objects do not pile up in the identity map
+        # or leak between users across requests.
+        @app.before_request
+        def before_flask_http_request_function():
+            if isinstance(repo.repo_instance, SqlAlchemyRepository):
+                repo.repo_instance.reset_session()
+
+        @app.teardown_request
+        def shutdown_session(exception=None):
+            if isinstance(repo.repo_instance, SqlAlchemyRepository):
+                repo.repo_instance.close_session()
+
         if app.config['TESTING'] == 'True' or len(inspect(database_engine).get_table_names()) == 0:
             print("REPOPULATING DATABASE...")
-            clear_mappers()
+            unmap_model()
             metadata.create_all(database_engine)
             with database_engine.connect() as conn:
                 for table in reversed(metadata.sorted_tables):
                     conn.execute(table.delete())
             map_model_to_tables()
             database_mode = True
-            populate(data_path, repo.repo_instance, database_mode)
+            populate(data_path, repo.repo_instance, database_mode, processes=app.config['CSV_READER_PROCESSES'])
             print("REPOPULATING DATABASE... FINISHED")
         else:
             map_model_to_tables()
+            # Databases created before the full-text index, the release ordinal, the rating counters or an index
+            # existed get them on their next start
+            with database_engine.begin() as conn:
+                add_release_ordinal_column(conn)
+                add_rating_aggregate_columns(conn)
+                create_missing_indexes(conn)
+                create_games_fts(conn)
 
     # Blueprint registration
     with app.app_context():
@@ -0,0 +1,42 @@
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import NullPool, QueuePool, StaticPool
+
+# Applied to every new SQLite connection the pool opens
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',      # readers no longer block behind a writer
+    'synchronous': 'NORMAL',    # safe with WAL and avoids an fsync per commit
+    'temp_store': 'MEMORY',
+    'cache_size': -16000,       # negative values are KiB, so 16 MB of page cache
+    'busy_timeout': 5000,       # wait up to 5s for a lock instead of failing straight away
+}
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+
+
+def create_database_engine(database_uri: str, pool: str = 'queue', pool_size: int = 5, max_overflow: int = 10,
+                           pool_recycle: int = -1, echo: bool = False):
+    """ Builds the engine for SqlAlchemyRepository.
+    pool is one of 'queue' (reuse up to pool_size + max_overflow connections), 'static' (a single shared
+    connection, needed for in-memory SQLite) or 'null' (open and close a connection for every checkout). """
+    pool = pool.strip().lower()
+    if pool == 'queue':
+        pool_args = dict(poolclass=QueuePool, pool_size=pool_size, max_overflow=max_overflow,
+                         pool_recycle=pool_recycle)
+    elif pool == 'static':
+        pool_args = dict(poolclass=StaticPool)
+    elif pool == 'null':
+        pool_args = dict(poolclass=NullPool)
+    else:
+        raise ValueError(f"Unknown connection pool '{pool}', expected 'queue', 'static' or 'null'")
+
+    engine = create_engine(database_uri, connect_args={"check_same_thread": False}, echo=echo, **pool_args)
+
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', set_sqlite_pragmas)
+
+    return engine
@@ -1,14 +1,21 @@
+import time
 from abc import ABC
-from typing import List, Type
-from sqlalchemy import func
+from typing import Callable, Dict, Iterable, List, Tuple, Type
+from sqlalchemy import func, insert, text, update, Integer, Float
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import scoped_session, joinedload
+from sqlalchemy.orm import scoped_session, joinedload, selectinload
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.sql.elements import or_, and_
 
-from games.adapters.orm import reviews_table, game_genres_table, user_wishlist_table
-from games.adapters.repository import AbstractRepository
-from games.domainmodel.model import Game, Publisher, Genre, User, Review
+from games.adapters.orm import (
+    game_genres_table, user_wishlist_table, games_table, genres_table, publishers_table,
+    GAMES_FTS_TABLE, games_fts_exists
+)
+from games.adapters.repository import (
+    AbstractRepository, GenreCache, GenreCountCache, KEYSET_ORDERS, PageBoundaryIndex, game_row_dicts, normalise_order_by,
+    parse_price_ranges
+)
+from games.domainmodel.model import Game, Publisher, Genre, User, Review, year_ordinal_range
 
 
 class SessionContextManager:
@@ -35,17 +42,21 @@ class SessionContextManager:
     def reset_session(self):
         # This method can be used to start a new session for each HTTP request, e.g., in a Flask app.
         self.close_current_session()
-        self.__session = scoped_session(self.__session_factory)
 
     def close_current_session(self):
         if not self.__session is None:
-            self.__session.close()
+            # Closes this thread's session and drops it from the registry, the next access opens a fresh one
+            self.__session.remove()
 
 
 class SqlAlchemyRepository(AbstractRepository, ABC):
 
     def __init__(self, session_factory):
         self._session_cm = SessionContextManager(session_factory)
+        self._genre_cache = GenreCache()
+        self._genre_counts = GenreCountCache()
+        self._page_boundaries = PageBoundaryIndex()
+        self._fts_available = None
 
     def close_session(self):
         self._session_cm.close_current_session()
@@ -59,6 +70,9 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
             try:
                 session.session.merge(game)
                 session.commit()
+                self._genre_cache.invalidate()
+                self._genre_counts.invalidate()
+                self._page_boundaries.invalidate()
             except IntegrityError:
                 # This error is raised if a duplicate entry is added, for example.
                 # You can handle this or any other database-specific errors as needed.
@@ -69,7 +83,7 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
 
 
     def get_wishlist(self, user: User) -> List[Game]:
-        return user._User__wishlist
+        return list(user._User__wishlist)
 
     def add_to_user_wishlist(self, user: User, game: Game):
         # Use SQLAlchemy to get the user object from the database based on the username.
@@ -133,6 +147,12 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
     def add_review(self, review: Review) -> Review:
         with self._session_cm as scm:
             scm.session.add(review)
+            # Counted in SQL within the same transaction as the insert, so concurrent reviews are not lost
+            scm.session.execute(
+                update(games_table)
+                .where(games_table.c.game_id == review.game.game_id)
+                .values(review_count=games_table.c.review_count + 1,
+                        rating_sum=games_table.c.rating_sum + review.rating))
             scm.commit()
 
     def get_game_by_id(self, game_id: int):
@@ -143,11 +163,125 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
             pass
         return game
 
+    # Loading profiles for the pages that walk relationships. Without them the template fires one SELECT
+    # per collection and one per review's user or game. Collections use selectinload so rows are not
+    # multiplied by joins, the many-to-one sides are joined into the query that loads them.
+    # Built per call since the mapped attributes only exist once map_model_to_tables has run.
+    @staticmethod
+    def _game_detail_options() -> list:
+        return [
+            joinedload(Game._Game__publisher),
+            selectinload(Game._Game__genres),
+            selectinload(Game._Game__reviews).joinedload(Review._Review__user),
+        ]
+
+    @staticmethod
+    def _user_profile_options() -> list:
+        return [
+            selectinload(User._User__reviews).joinedload(Review._Review__game),
+            selectinload(User._User__favourite_games),
+            selectinload(User._User__wishlist),
+        ]
+
+    def get_game_detail(self, game_id: int) -> Game:
+        game = None
+        try:
+            game = (self._session_cm.session.query(Game)
+                    .options(*self._game_detail_options())
+                    .filter(Game._Game__game_id == game_id)
+                    .one())
+        except NoResultFound:
+            pass
+        return game
+
+    def get_user_profile(self, username: str) -> User:
+        user = None
+        try:
+            user = (self._session_cm.session.query(User)
+                    .options(*self._user_profile_options())
+                    .filter_by(_User__username=username)
+                    .one())
+        except NoResultFound:
+            pass
+        return user
+
     def add_multiple_games(self, games: List[Game]):
         with self._session_cm as scm:
             for game in games:
                 scm.session.merge(game)
             scm.commit()
+        self._genre_cache.invalidate()
+        self._genre_counts.invalidate()
+        self._page_boundaries.invalidate()
+
+    def bulk_load_catalogue(self, game_batches: Iterable[List[Game]],
+                            progress: Callable[[str, int], None] = None) -> dict:
+        """ Inserts a whole catalogue into empty tables with executemany Core inserts in one transaction,
+        skipping the SELECT that merge() issues per object. Games arrive in batches (see
+        GameFileCSVReader.iter_game_batches); the publishers and genres they use are inserted just
+        before them, and a game id seen in an earlier batch is skipped.
+        progress(table_name, rows_done) is called after every insert with the running total for that table.
+        Returns the number of rows inserted, the time taken and rows/sec. """
+        seen_publishers = set()
+        seen_genres = set()
+        seen_games = set()
+        rows_done = {table.name: 0 for table in (publishers_table, genres_table, games_table, game_genres_table)}
+
+        start = time.perf_counter()
+        with self._session_cm as scm:
+            for games in game_batches:
+                games = [game for game in games if game.game_id not in seen_games]
+                seen_games.update(game.game_id for game in games)
+
+                publisher_rows = []
+                genre_rows = []
+                game_rows = []
+                game_genre_rows = []
+                for game in games:
+                    publisher_name = game.publisher.publisher_name if game.publisher is not None else None
+                    if publisher_name is not None and publisher_name not in seen_publishers:
+                        seen_publishers.add(publisher_name)
+                        publisher_rows.append({'name': publisher_name})
+                    game_rows.append({
+                        'game_id': game.game_id,
+                        'game_title': game.title,
+                        'game_price': game.price,
+                        'release_date': game.release_date,
+                        'release_ordinal': game.release_ordinal,
+                        'review_count': game.review_count,
+                        'rating_sum': game.rating_sum,
+                        'game_description': game.description,
+                        'game_image_url': game.image_url,
+                        'publisher_name': publisher_name,
+                    })
+                    for genre in game.genres:
+                        if genre.genre_name is None:
+                            continue
+                        if genre.genre_name not in seen_genres:
+                            seen_genres.add(genre.genre_name)
+                            genre_rows.append({'genre_name': genre.genre_name})
+                        game_genre_rows.append({'game_id': game.game_id, 'genre_name': genre.genre_name})
+
+                for table, rows in ((publishers_table, publisher_rows), (genres_table, genre_rows),
+                                    (games_table, game_rows), (game_genres_table, game_genre_rows)):
+                    if not rows:
+                        continue
+                    scm.session.execute(insert(table), rows)
+                    rows_done[table.name] += len(rows)
+                    if progress is not None:
+                        progress(table.name, rows_done[table.name])
+            scm.commit()
+        seconds = time.perf_counter() - start
+
+        self._genre_cache.invalidate()
+        self._genre_counts.invalidate()
+        self._page_boundaries.invalidate()
+        total_rows = sum(rows_done.values())
+        return {
+            'rows': total_rows,
+            'seconds': seconds,
+            'rows_per_second': total_rows / seconds if seconds > 0 else float(total_rows),
+        }
 
     def get_publishers(self) -> List[Publisher]:
         pass
@@ -186,8 +320,8 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
             # Check if the game is not already in the user's favorite games
             if game_from_db not in user_from_db._User__favourite_games:
                 # Assuming that you have a relationship between User and Game for favorite games,
-                # you can simply add the game to the user's favorite games list.
-                user_from_db._User__favourite_games.append(game_from_db)
+                # you can simply add the game to the user's favorite games set.
+                user_from_db._User__favourite_games.add(game_from_db)
 
                 with self._session_cm as scm:
                     scm.commit()
@@ -213,21 +347,47 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
         with self._session_cm as scm:
             scm.session.merge(genre)
             scm.commit()
+        self._genre_cache.invalidate()
 
     def add_multiple_genres(self, genres: List[Genre]):
         with self._session_cm as scm:
             for genre in genres:
                 scm.session.merge(genre)
             scm.commit()
+        self._genre_cache.invalidate()
 
     def search_games_by_title(self, title_string: str) -> List[Game]:
         session = self._session_cm.session
-        games = session.query(Game).filter(Game._Game__game_title.ilike(f"%{title_string}%")).all()
+        games_query = session.query(Game)
+        if self._use_full_text(title_string):
+            return self._match_full_text(games_query, 'game_title', title_string).all()
+        games = games_query.filter(Game._Game__game_title.ilike(f"%{title_string}%")).all()
         return games
 
+    def _use_full_text(self, text_query: str) -> bool:
+        # Trigram phrases need at least three characters, shorter queries go through LIKE
+        if len(text_query) < 3:
+            return False
+        if self._fts_available is None:
+            self._fts_available = games_fts_exists(self._session_cm.session.connection())
+        return self._fts_available
+
+    def _match_full_text(self, games_query, column: str, text_query: str):
+        """ Restricts games_query to games whose column contains text_query, best matches first. """
+        phrase = text_query.replace('"', '""')
+        matches = (
+            text(f"SELECT rowid AS game_id, rank FROM {GAMES_FTS_TABLE} WHERE {GAMES_FTS_TABLE} MATCH :match")
+            .bindparams(match=f'{{{column}}} : "{phrase}"')
+            .columns(game_id=Integer, rank=Float)
+            .subquery()
+        )
+        return games_query.join(matches, matches.c.game_id == Game._Game__game_id).order_by(matches.c.rank)
+
     def get_favs(self, user: User) -> List[Game]:
-        # Ensure that the user is loaded with their favorite games.
-        self._session_cm.session.refresh(user)
+        # Sessions only live for one request, so a user loaded by it is already up to date.
+        # A user left over from an earlier session is looked up again instead.
+        if user not in self._session_cm.session:
+            user = self.get_user(user.username)
 
         # Access the favorite games directly from the loaded user object.
         return user.favourite_games
@@ -243,10 +403,23 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
         return game
 
     def get_number_of_games_by_genre(self, genre):
-        games = self.get_games_by_genre(genre)
-        return len(games)
+        return self._genre_counts.get(genre, self._load_genre_counts)
+
+    def _load_genre_counts(self) -> Dict[str, int]:
+        # Two counting queries answered from the indexes, no Game objects are loaded
+        session = self._session_cm.session
+        counts = dict(
+            session.query(game_genres_table.c.genre_name, func.count(game_genres_table.c.game_id.distinct()))
+            .group_by(game_genres_table.c.genre_name)
+            .all()
+        )
+        counts["All"] = session.query(func.count(games_table.c.game_id)).scalar()
+        return counts
 
     def get_game_genres(self) -> List[str]:
+        return self._genre_cache.get(self._load_game_genres)
+
+    def _load_game_genres(self) -> List[str]:
         unique_genres = (
             self._session_cm.session.query(Genre._Genre__genre_name)
             .distinct()
@@ -277,43 +450,137 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
 
     def get_games_pagination(self, genre="All", offset=0, limit=10, order_by='title'):
         session = self._session_cm.session
-
-        # If the genre is "All", we don't filter by genre
-        if genre == "All":
-            query = session.query(Game)
+        order_by = normalise_order_by(order_by)
+
+        query = self._listing_query(self._game_row_query(session), genre)
+        if order_by in KEYSET_ORDERS:
+            # Same order the keyset pages seek through
+            query = query.order_by(*self._keyset_order(order_by))
+        elif order_by == 'rating':
+            # Highest average rating first, unrated games last
+            average = games_table.c.rating_sum * 1.0 / games_table.c.review_count
+            query = query.order_by(games_table.c.review_count == 0, average.desc(), games_table.c.game_id)
         else:
-            query = (session.query(Game)
-                     .join(game_genres_table)  # join with game_genres table
-                     .join(Genre, Genre._Genre__genre_name == game_genres_table.c.genre_name)  # join with genres
-                     .filter(Genre._Genre__genre_name == genre))
-
-        # Sort the query results
-        query = query.order_by(
-            getattr(Game, '_Game__' + order_by))  # Adjusted this line to filter based on Game's attributes
+            query = query.order_by(
+                getattr(Game, '_Game__' + order_by))  # Adjusted this line to filter based on Game's attributes
 
         # Apply offset and limit
-        paginated_games = query.offset(offset).limit(limit).all()
-
-        game_dicts = [{
-            "game_id": game._Game__game_id,
-            "title": game._Game__game_title,
-            "release_date": game._Game__release_date
-        } for game in paginated_games]
+        game_dicts = game_row_dicts(query.offset(offset).limit(limit).all())
 
         session.close()
 
         return game_dicts
 
+    def get_games_after(self, genre="All", after=None, limit=10, order_by='title'):
+        order_by = normalise_order_by(order_by)
+        if order_by not in KEYSET_ORDERS:
+            raise ValueError(f"Cannot seek through games ordered by {order_by}")
+        game_dicts = game_row_dicts(self._rows_after(genre, after, limit, order_by))
+        self._session_cm.session.close()
+        return game_dicts
+
+    def get_games_page(self, genre="All", page=1, page_size=10, order_by='title'):
+        order_by = normalise_order_by(order_by)
+        page = max(page, 1)
+        if order_by not in KEYSET_ORDERS:
+            return self.get_games_pagination(genre, (page - 1) * page_size, page_size, order_by)
+
+        listing = (genre, order_by, page_size)
+        # Read before the lookup, so boundaries are not kept if the catalogue changes meanwhile
+        generation = self._page_boundaries.generation
+        known_page, cursor = self._page_boundaries.nearest(listing, page)
+        if known_page < page:
+            known_page, cursor = self._walk_page_boundaries(listing, known_page, cursor, page, generation)
+            if known_page < page:
+                # The listing ends before this page
+                self._session_cm.session.close()
+                return []
+
+        rows = self._rows_after(genre, cursor, page_size, order_by)
+        if len(rows) == page_size:
+            # Makes the Next link a direct seek
+            self._page_boundaries.remember(listing, page + 1, self._cursor_of(rows[-1], order_by), generation)
+        game_dicts = game_row_dicts(rows)
+
+        self._session_cm.session.close()
+
+        return game_dicts
+
+    def _walk_page_boundaries(self, listing, known_page, cursor, page, generation) -> Tuple[int, tuple]:
+        """ Reads only the sort keys from the boundary of known_page up to the start of page, keeping the
+        boundaries the index wants on the way. Returns the last page reached and its cursor. """
+        genre, order_by, page_size = listing
+        column = self._keyset_order(order_by)[-2]
+        query = self._listing_query(self._session_cm.session.query(column, games_table.c.game_id), genre)
+        query = self._seek(query, order_by, cursor).limit((page - known_page) * page_size)
+
+        for position, (value, game_id) in enumerate(query, start=1):
+            if position % page_size == 0:
+                known_page += 1
+                cursor = (value, game_id)
+                if known_page == page or self._page_boundaries.should_keep(known_page):
+                    self._page_boundaries.remember(listing, known_page, cursor, generation)
+        return known_page, cursor
+
+    def _rows_after(self, genre, after, limit, order_by) -> List[tuple]:
+        query = self._listing_query(self._game_row_query(self._session_cm.session), genre)
+        return self._seek(query, order_by, after).limit(limit).all()
+
+    @staticmethod
+    def _game_row_query(session):
+        # Only the columns of a page row (and the sort keys for the next cursor): no Game objects,
+        # publishers or collections are loaded for list pages
+        return session.query(games_table.c.game_id, games_table.c.game_title, games_table.c.release_date,
+                             games_table.c.release_ordinal)
+
+    @staticmethod
+    def _listing_query(query, genre):
+        # If the genre is "All", we don't filter by genre
+        if genre == "All":
+            return query
+        return (query.join(game_genres_table, game_genres_table.c.game_id == games_table.c.game_id)
+                .filter(game_genres_table.c.genre_name == genre))
+
+    @staticmethod
+    def _keyset_order(order_by) -> list:
+        # Release dates sort chronologically rather than by their text, undated games last
+        if order_by == 'release_date':
+            ordinal = games_table.c.release_ordinal
+            return [ordinal.is_(None), ordinal, games_table.c.game_id]
+        return [games_table.c.game_title, games_table.c.game_id]
+
+    def _seek(self, query, order_by, after):
+        """ Orders the query for keyset pagination and, given a cursor, starts it after that game. """
+        query = query.order_by(*self._keyset_order(order_by))
+        if after is None:
+            return query
+        value, game_id = after
+        column = self._keyset_order(order_by)[-2]
+        game_id_column = games_table.c.game_id
+        if value is None:
+            # Only undated games follow an undated game
+            return query.filter(and_(column.is_(None), game_id_column > game_id))
+        condition = or_(column > value, and_(column == value, game_id_column > game_id))
+        if order_by == 'release_date':
+            condition = or_(condition, column.is_(None))
+        return query.filter(condition)
+
+    @staticmethod
+    def _cursor_of(row, order_by) -> tuple:
+        value = row.release_ordinal if order_by == 'release_date' else row.game_title
+        return value, row.game_id
+
     def calculate_average_rating(self, game_id, reviews):
         session = self._session_cm.session
 
-        average_rating = session.query(func.avg(reviews_table.c.rating)) \
-            .filter(reviews_table.c.game_id == game_id) \
-            .scalar()
+        # One primary key lookup of the counters add_review maintains
+        totals = session.query(games_table.c.review_count, games_table.c.rating_sum) \
+            .filter(games_table.c.game_id == game_id) \
+            .one_or_none()
 
-        if average_rating is None:
+        if totals is None or not totals.review_count:
             return 0.0
-        return round(average_rating, 1)
+        return round(totals.rating_sum / totals.review_count, 1)
 
     def search_games(self, query: str, filter_option: str, price_filter: list) -> List[Game]:
         # Use session from the context manager
@@ -323,26 +590,34 @@ class SqlAlchemyRepository(AbstractRepository, ABC):
         )
 
         if filter_option == 'Title':
-            games_query = games_query.filter(Game._Game__game_title.ilike(f"%{query}%"))
+            if self._use_full_text(query):
+                games_query = self._match_full_text(games_query, 'game_title', query)
+            else:
+                games_query = games_query.filter(Game._Game__game_title.ilike(f"%{query}%"))
         elif filter_option == 'Genre':
             games_query = games_query.join(Game._Game__genres).filter(Genre._Genre__genre_name.ilike(f"%{query}%"))
         elif filter_option == 'Publisher':
-            games_query = games_query.join(Game._Game__publisher).filter(Publisher._Publisher__publisher_name.ilike(f"%{query}%"))
+            if self._use_full_text(query):
+                games_query = self._match_full_text(games_query, 'publisher_name', query)
+            else:
+                games_query = games_query.join(Game._Game__publisher).filter(Publisher._Publisher__publisher_name.ilike(f"%{query}%"))
         elif filter_option == 'Release Year' and query.isdigit():
-            year = int(query)
-            # If release_date is a string:
-            games_query = games_query.filter(Game._Game__release_date.like(f"% {year}"))
-            # If release_date is a date object:
-            # games_query = games_query.filter(func.extract('year', Game._Game__release_date) == year)
+            # A range on the indexed release ordinal instead of matching the end of the date string
+            try:
+                start, end = year_ordinal_range(int(query))
+            except ValueError:
+                # Outside of the years a date can hold, so nothing was released then
+                return []
+            games_query = games_query.filter(Game._Game__release_ordinal >= start, Game._Game__release_ordinal < end)
         else:
             # Invalid filter option
             return []
 
 
         if price_filter:
+            # Merged ranges, each answered by a range scan on the game_price index
             price_conditions = []
-            for price_range in price_filter:
-                min_price, max_price = map(int, price_range.split('-'))
+            for min_price, max_price in parse_price_ranges(price_filter):
                 price_conditions.append(and_(Game._Game__price >= min_price, Game._Game__price <= max_price))
             games_query = games_query.filter(or_(*price_conditions))
 
@@ -0,0 +1,92 @@
+import gc
+import hashlib
+import os
+import pickle
+import tempfile
+from typing import Union
+
+# Bump whenever the pickled domain objects or repository structures change shape, so old snapshots are rebuilt
+SNAPSHOT_VERSION = 6
+
+
+def snapshot_path(csv_filename: str) -> str:
+    return f"{csv_filename}.snapshot"
+
+
+def file_sha256(filename: str) -> str:
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_snapshot(csv_filename: str, lazy_details: bool = False) -> Union[dict, None]:
+    """ Returns the catalogue saved by write_snapshot if the snapshot was built from this exact CSV in the same
+    details mode, otherwise None; a snapshot that fails to unpickle is deleted.
+    Size and mtime are checked first; the CSV is only hashed when its mtime changed. """
+    path = snapshot_path(csv_filename)
+    if not os.path.exists(csv_filename) or not os.path.exists(path):
+        return None
+
+    try:
+        with open(path, 'rb') as file:
+            header = pickle.load(file)
+            stat = os.stat(csv_filename)
+            if header.get('version') != SNAPSHOT_VERSION or header.get('size') != stat.st_size:
+                return None
+            if header.get('lazy_details', False) != lazy_details:
+                return None
+            if header.get('mtime_ns') != stat.st_mtime_ns and header.get('sha256') != file_sha256(csv_filename):
+                return None
+            # Unpickling allocates millions of objects that are all kept, so the cyclic garbage collector
+            # would repeatedly scan them for nothing. It is paused until the catalogue is loaded.
+            gc_was_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                return pickle.load(file)
+            finally:
+                if gc_was_enabled:
+                    gc.enable()
+    except OSError as e:
+        print(f"Ignoring unreadable snapshot {path}: {e}")
+        return None
+    except Exception as e:
+        # A damaged pickle can fail with almost any exception, none of which should stop the app starting
+        print(f"Ignoring damaged snapshot {path}: {e!r}")
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+
+def write_snapshot(csv_filename: str, catalogue: dict, lazy_details: bool = False):
+    """ Saves a parsed catalogue next to the CSV: a dict with the games under 'games', in id order, and
+    optionally the structures a repository derived from them. Failing to write (e.g. a read-only data folder)
+    only means the next start parses the CSV again. Games with lazy details keep their loader,
+    so the snapshot holds record offsets instead of descriptions and screenshot urls. """
+    path = snapshot_path(csv_filename)
+    stat = os.stat(csv_filename)
+    header = {
+        'version': SNAPSHOT_VERSION,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': file_sha256(csv_filename),
+        'lazy_details': lazy_details,
+    }
+
+    temp_path = None
+    try:
+        # Each process writes its own temporary file, so workers starting together never share one;
+        # the last complete snapshot to be moved into place wins
+        fd, temp_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix='.tmp',
+                                         dir=os.path.dirname(path) or None)
+        with os.fdopen(fd, 'wb') as file:
+            pickle.dump(header, file, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(catalogue, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Could not write snapshot {path}: {e}")
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
@@ -1,46 +1,322 @@
 import csv
+import io
+import mmap
 import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Callable, Dict, List, Tuple, Union
 
-from games.domainmodel.model import Genre, Game, Publisher
+from games.domainmodel.model import Genre, Game, InternRegistry, Publisher
+
+# The only columns read_game uses. The others (reviews, movies, supported languages, ...) are
+# skipped, and the detail columns are left in the file when details are loaded lazily.
+GAME_COLUMNS = ("AppID", "Name", "Release date", "Price", "About the game", "Screenshots", "Publishers", "Genres")
+# Game field -> CSV column of the large fields that are only needed on a game's own page
+DETAIL_COLUMNS = {'description': "About the game", 'image_url': "Screenshots"}
+
+
+def column_indices(fieldnames: List[str], columns=GAME_COLUMNS) -> Dict[str, int]:
+    return {column: fieldnames.index(column) for column in columns if column in fieldnames}
+
+
+def project_row(fields: List[str], indices: Dict[str, int]) -> dict:
+    """ Picks the wanted columns out of a parsed record. Missing columns surface as a KeyError in read_game. """
+    return {column: fields[index] for column, index in indices.items() if index < len(fields)}
+
+
+def read_game(row: dict, details_loader: Callable[[int, str], str] = None,
+              registry: InternRegistry = None) -> Union[Game, None]:
+    """ Builds a Game from one row of games.csv, or returns None if the row is invalid.
+    With a details_loader the description and image url are not taken from the row but fetched when read.
+    With a registry the game gets the registry's shared Publisher and Genre instances. """
+    try:
+        game_id = int(row["AppID"])
+        title = row["Name"]
+        game = Game(game_id, title)
+        game.release_date = row["Release date"]
+        game.price = float(row["Price"])
+        if details_loader is None:
+            game.description = row[DETAIL_COLUMNS['description']]
+            game.image_url = row[DETAIL_COLUMNS['image_url']]
+        else:
+            game.set_details_loader(details_loader)
+        if registry is None:
+            game.publisher = Publisher(row["Publishers"])
+        else:
+            game.publisher = registry.publisher(row["Publishers"])
+        genre_names = row["Genres"].split(",")
+        for genre_name in genre_names:
+            if registry is None:
+                game.add_genre(Genre(genre_name.strip()))
+            else:
+                game.add_genre(registry.genre(genre_name.strip()))
+
+        return game
+
+    except ValueError as e:
+        print(f"Skipping row due to invalid data: {e}")
+    except KeyError as e:
+        print(f"Skipping row due to missing key: {e}")
+    return None
+
+
+def iter_raw_records(file) -> Tuple[int, bytes]:
+    """ Yields (byte offset, raw bytes) for every record of a CSV file opened in binary mode,
+    joining lines while a quoted field is still open. """
+    offset = 0
+    start = 0
+    lines = []
+    quotes = 0
+    for line in file:
+        if not lines:
+            start = offset
+        lines.append(line)
+        quotes += line.count(b'"')
+        offset += len(line)
+        if quotes % 2 == 0:
+            yield start, b''.join(lines)
+            lines = []
+            quotes = 0
+    if lines:
+        yield start, b''.join(lines)
+
+
+def parse_raw_record(raw: bytes, encoding: str = 'utf-8') -> List[str]:
+    # Same newline translation as reading the file in text mode
+    text = raw.decode(encoding).replace('\r\n', '\n').replace('\r', '\n')
+    return next(csv.reader([text]), [])
+
+
+def record_end(data, offset: int) -> int:
+    """ Returns the end of the record starting at offset in a buffer (e.g. an mmap), see iter_raw_records. """
+    position = offset
+    quotes = 0
+    while True:
+        newline = data.find(b'\n', position)
+        if newline == -1:
+            return len(data)
+        quotes += data[position:newline + 1].count(b'"')
+        position = newline + 1
+        if quotes % 2 == 0:
+            return position
+
+
+class CSVRecordStore:
+    """ Reads the detail columns of games.csv back from the byte offset of each game's record, so
+    descriptions and screenshot urls do not have to stay in memory. The file is memory mapped on first
+    use and the details of the most recently read games are kept in a small LRU cache. """
+
+    def __init__(self, filename: str, fieldnames: List[str], cache_size: int = 256):
+        self.__filename = filename
+        self.__indices = {field: fieldnames.index(column) for field, column in DETAIL_COLUMNS.items()
+                          if column in fieldnames}
+        self.__offsets = {}
+        self.__cache_size = cache_size
+        self.__cache = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__data = None
+
+    def __getstate__(self):
+        # Pickled into catalogue snapshots: keep the offsets, not the open map or cached text
+        state = self.__dict__.copy()
+        state['_CSVRecordStore__cache'] = OrderedDict()
+        state['_CSVRecordStore__lock'] = None
+        state['_CSVRecordStore__data'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+
+    def add(self, game_id: int, offset: int):
+        self.__offsets[game_id] = offset
+
+    def read_detail(self, game_id: int, field: str) -> Union[str, None]:
+        details = self.__details(game_id)
+        return details.get(field) if details is not None else None
+
+    def __details(self, game_id: int) -> Union[dict, None]:
+        with self.__lock:
+            details = self.__cache.get(game_id)
+            if details is not None:
+                self.__cache.move_to_end(game_id)
+                return details
+
+            offset = self.__offsets.get(game_id)
+            if offset is None:
+                return None
+            if self.__data is None:
+                with open(self.__filename, 'rb') as file:
+                    self.__data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            fields = parse_raw_record(self.__data[offset:record_end(self.__data, offset)])
+
+            # Same clean up as the Game setters, so lazy and eager games read the same
+            details = {}
+            for field, index in self.__indices.items():
+                value = fields[index] if index < len(fields) else None
+                details[field] = value if isinstance(value, str) and value.strip() != "" else None
+
+            self.__cache[game_id] = details
+            if len(self.__cache) > self.__cache_size:
+                self.__cache.popitem(last=False)
+            return details
+
+
+def split_csv_records(filename: str, parts: int) -> Tuple[List[str], List[Tuple[int, int]]]:
+    """ Returns the header of the CSV file and up to `parts` (start, end) byte ranges that together
+    cover every record. Ranges only end on a newline outside of quotes, so quoted fields that
+    span several lines are never cut. Quote and newline bytes cannot occur inside a multibyte
+    UTF-8 character, so counting them on the raw bytes is safe. """
+    with open(filename, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return [], []
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            size = len(data)
+            header_end = data.find(b'\n') + 1 or size
+            fieldnames = next(csv.reader([data[:header_end].decode('utf-8-sig')]), [])
+
+            boundaries = [header_end]
+            position = header_end
+            inside_quotes = False
+            step = max(1, (size - header_end) // max(1, parts))
+            for target in range(header_end + step, size, step):
+                if target <= position:
+                    continue
+                inside_quotes ^= data[position:target].count(b'"') % 2 == 1
+                position = target
+                # Move on to the first newline that is not inside a quoted field
+                while True:
+                    newline = data.find(b'\n', position)
+                    if newline == -1:
+                        break
+                    inside_quotes ^= data[position:newline + 1].count(b'"') % 2 == 1
+                    position = newline + 1
+                    if not inside_quotes:
+                        break
+                if position >= size or newline == -1:
+                    break
+                boundaries.append(position)
+            boundaries.append(size)
+
+    ranges = [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+    return fieldnames, ranges
+
+
+def read_games_in_range(filename: str, fieldnames: List[str], byte_range: Tuple[int, int]) -> List[Game]:
+    """ Parses the records between two boundaries found by split_csv_records. Runs in worker processes. """
+    start, end = byte_range
+    with open(filename, 'rb') as file:
+        file.seek(start)
+        text = file.read(end - start).decode('utf-8')
+
+    # newline=None translates line endings the same way open() does for read_csv_file
+    reader = csv.reader(io.StringIO(text, newline=None))
+    indices = column_indices(fieldnames)
+    # Shared within the chunk so each genre and publisher is pickled back only once
+    registry = InternRegistry()
+    games = []
+    for fields in reader:
+        if not fields:
+            continue
+        game = read_game(project_row(fields, indices), registry=registry)
+        if game is not None:
+            games.append(game)
+    return games
 
 
 class GameFileCSVReader:
-    def __init__(self, filename):
+    def __init__(self, filename, lazy_details: bool = False):
         self.__filename = filename
+        # When set, descriptions and screenshots stay in the file and are read back through a CSVRecordStore
+        self.__lazy_details = lazy_details
+        self.__registry = InternRegistry()
         self.__dataset_of_games = []
         self.__dataset_of_publishers = set()
         self.__dataset_of_genres = set()
 
     def read_csv_file(self):
+        for games in self.iter_game_batches():
+            self.__dataset_of_games.extend(games)
+
+    def read_csv_file_parallel(self, processes: int = None):
+        for games in self.iter_game_batches_parallel(processes):
+            self.__dataset_of_games.extend(games)
+
+    def iter_game_batches(self, batch_size: int = 1000):
+        """ Yields the games in the file as lists of at most batch_size games, so callers can hand them
+        to a repository without holding the whole file in memory. Publishers and genres are still
+        collected, but the games are not kept in dataset_of_games. """
         if not os.path.exists(self.__filename):
             print(f"path {self.__filename} does not exist!")
             return
+        batch = []
+        for game in (self.__iter_games_lazily() if self.__lazy_details else self.__iter_games()):
+            self.__collect(game)
+            batch.append(game)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def __iter_games(self):
         with open(self.__filename, 'r', encoding='utf-8-sig') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                try:
-                    game_id = int(row["AppID"])
-                    title = row["Name"]
-                    game = Game(game_id, title)
-                    game.release_date = row["Release date"]
-                    game.price = float(row["Price"])
-                    game.description = row["About the game"]
-                    game.image_url = row["Screenshots"]
-                    publisher = Publisher(row["Publishers"])
-                    self.__dataset_of_publishers.add(publisher)
-                    game.publisher = publisher
-                    genre_names = row["Genres"].split(",")
-                    for genre_name in genre_names:
-                        genre = Genre(genre_name.strip())
-                        self.__dataset_of_genres.add(genre)
-                        game.add_genre(genre)
-
-                    self.__dataset_of_games.append(game)
-
-                except ValueError as e:
-                    print(f"Skipping row due to invalid data: {e}")
-                except KeyError as e:
-                    print(f"Skipping row due to missing key: {e}")
+            reader = csv.reader(file)
+            indices = column_indices(next(reader, []))
+            for fields in reader:
+                if not fields:
+                    continue
+                game = read_game(project_row(fields, indices), registry=self.__registry)
+                if game is not None:
+                    yield game
+
+    def __iter_games_lazily(self):
+        with open(self.__filename, 'rb') as file:
+            records = iter_raw_records(file)
+            header = next(records, None)
+            if header is None:
+                return
+            fieldnames = parse_raw_record(header[1], 'utf-8-sig')
+            store = CSVRecordStore(self.__filename, fieldnames)
+            # One bound method shared by every game rather than one per game
+            details_loader = store.read_detail
+            indices = column_indices(fieldnames, [c for c in GAME_COLUMNS if c not in DETAIL_COLUMNS.values()])
+            for offset, raw in records:
+                fields = parse_raw_record(raw)
+                if not fields:
+                    continue
+                game = read_game(project_row(fields, indices), details_loader, self.__registry)
+                if game is not None:
+                    store.add(game.game_id, offset)
+                    yield game
+
+    def iter_game_batches_parallel(self, processes: int = None, chunks_per_process: int = 4):
+        """ Like iter_game_batches, but the file is split into chunks on record boundaries and the chunks
+        are parsed by a pool of processes (one per CPU by default). Batches are yielded in file order,
+        one per chunk, and the publishers and genres of every chunk are merged here.
+        Lazy details need the offset of every record, so that mode always reads sequentially. """
+        if self.__lazy_details:
+            yield from self.iter_game_batches()
+            return
+        if not os.path.exists(self.__filename):
+            print(f"path {self.__filename} does not exist!")
+            return
+        processes = processes or os.cpu_count() or 1
+        fieldnames, ranges = split_csv_records(self.__filename, processes * chunks_per_process)
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            for games in executor.map(read_games_in_range, repeat(self.__filename), repeat(fieldnames), ranges):
+                for game in games:
+                    # Games from different worker processes do not share instances yet
+                    self.__registry.intern_game(game)
+                    self.__collect(game)
+                yield games
+
+    def __collect(self, game: Game):
+        self.__dataset_of_publishers.add(game.publisher)
+        self.__dataset_of_genres.update(game.genres)
 
     def get_unique_games_count(self):
         return len(self.__dataset_of_games)
@@ -62,4 +338,3 @@ class GameFileCSVReader:
     @property
     def dataset_of_genres(self) -> set:
         return self.__dataset_of_genres
-
@@ -1,16 +1,29 @@
 import os
-from bisect import insort_left
+from bisect import bisect_right, insort_left
 from pathlib import Path
 
-from games.adapters.repository import AbstractRepository
-from games.domainmodel.model import Game, User, Review, Wishlist, Publisher, Genre
+from games.adapters.repository import (
+    AbstractRepository, GenreCache, game_row_dicts, normalise_order_by, parse_price_ranges
+)
+from games.adapters.search_index import SearchIndex
+from games.domainmodel.model import Game, User, Review, Wishlist, Publisher, Genre, InternRegistry, OrderedSet
 from games.adapters.datareader.csvdatareader import GameFileCSVReader
-from typing import List, Union
+from games.adapters.datareader.catalogue_snapshot import load_snapshot, write_snapshot
+from typing import List, Tuple, Union
 
 
 class MemoryRepository(AbstractRepository):
     def __init__(self):
         self.__games = list()
+        self.__games_by_id = dict()
+        self.__games_by_genre = dict()
+        # (genre, order_by) -> ((game_id, title, release_date) rows sorted for pagination, their sort keys),
+        # built on first request
+        self.__sorted_views = dict()
+        # One Publisher and Genre instance per name across every game in the repository
+        self.__registry = InternRegistry()
+        self.__genre_cache = GenreCache()
+        self.__search_index = SearchIndex()
         self.__users = dict()
         self.__reviews = list()
         self.__user_wishlists = {}
@@ -28,7 +41,7 @@ class MemoryRepository(AbstractRepository):
         if user.username in self.__user_wishlists:
             wishlist = self.__user_wishlists[user.username]
 
-            if game not in wishlist.list_of_games():
+            if game not in wishlist:
                 wishlist.add_game(game)
                 print(f"Game {game} successfully added to {user.username}'s wishlist")  # New debug print
         else:
@@ -43,29 +56,56 @@ class MemoryRepository(AbstractRepository):
 
     def add_to_user_favorite(self, user, game):
         if user.username in self.__fav_games:
-            user_fav_games = self.__fav_games[user.username]
-            if game not in user_fav_games:
-                user_fav_games.append(game)
+            self.__fav_games[user.username].add(game)
         else:
-            self.__fav_games[user.username] = [game]
+            self.__fav_games[user.username] = OrderedSet([game])
 
     def remove_to_user_favorite(self, user, game):
         if user.username in self.__fav_games:
-            user_fav_games = self.__fav_games[user.username]
-            if game in user_fav_games:
-                user_fav_games.remove(game)
+            self.__fav_games[user.username].discard(game)
 
     # Games ------------------------------------
     def add_game(self, game: Game):
         if isinstance(game, Game):
+            self.__registry.intern_game(game)
             insort_left(self.__games, game)
+            self.__games_by_id[game.game_id] = game
+            for genre in game.genres:
+                insort_left(self.__games_by_genre.setdefault(genre.genre_name, []), game)
+            self.__sorted_views.clear()
+            self.__genre_cache.invalidate()
+            self.__search_index.add_game(game)
 
     def get_games(self) -> List[Game]:
         return self.__games
 
+    def catalogue_state(self) -> dict:
+        """ The games together with every structure derived from them, for a catalogue snapshot. """
+        return {
+            'games': self.__games,
+            'games_by_id': self.__games_by_id,
+            'games_by_genre': self.__games_by_genre,
+            'registry': self.__registry,
+            'search_index': self.__search_index,
+        }
+
+    def restore_catalogue_state(self, state: dict):
+        """ Takes over a state saved by catalogue_state, so loading a snapshot does not index every game again.
+        A repository that already holds games, or a state with only the games, adds them one by one instead. """
+        if self.__games or 'search_index' not in state:
+            self.add_multiple_games(state['games'])
+            return
+        self.__games = state['games']
+        self.__games_by_id = state['games_by_id']
+        self.__games_by_genre = state['games_by_genre']
+        self.__registry = state['registry']
+        self.__search_index = state['search_index']
+        self.__sorted_views.clear()
+        self.__genre_cache.invalidate()
+
     def get_favs(self, user):
         if user.username in self.__fav_games:
-            return self.__fav_games[user.username]
+            return list(self.__fav_games[user.username])
         return []
 
     def get_number_of_games(self):
@@ -84,124 +124,112 @@ class MemoryRepository(AbstractRepository):
     def add_review(self, review) -> Review:
         if isinstance(review, Review):
             insort_left(self.__reviews, review)
+            review.game.record_rating(review.rating)
+            # Only the views sorted by rating change
+            for key in [key for key in self.__sorted_views if key[1] == 'rating']:
+                del self.__sorted_views[key]
 
     def get_game_by_id(self, game_id: int):
-        for game in self.__games:
-            if game.game_id == game_id:
-                return game
+        if not isinstance(game_id, int):
+            return None
+        return self.__games_by_id.get(game_id)
+
+    # Everything is already in memory, so the page profiles are the plain lookups
+    def get_game_detail(self, game_id: int) -> Game:
+        return self.get_game_by_id(game_id)
+
+    def get_user_profile(self, username: str) -> Union[User, None]:
+        return self.get_user(username)
 
 
 # NEW TESTING FOR CHANGES TO MEMORY REPO
     def search_games(self, query: str, filter_option: str, price_filter: list) -> List[Game]:
-        games = self.__games
-        filtered_games = []
+        return self.__search_index.search(query, filter_option, parse_price_ranges(price_filter))
 
-        for game in games:
-            if (query.lower() in game.title.lower() or
-                    query.lower() in game.publisher.publisher_name.lower() or
-                    query.lower() in [genre.genre_name.lower() for genre in game.genres] or query.isdigit()):
-
-                if filter_option == 'Title':
-                    if query.lower() in game.title.lower():
-                        filtered_games.append(game)
-                elif filter_option == 'Genre':
-                    if any(genre.genre_name.lower() == query.lower() for genre in game.genres):
-                        filtered_games.append(game)
-                elif filter_option == 'Publisher':
-                    if query.lower() in game.publisher.publisher_name.lower():
-                        filtered_games.append(game)
-                elif filter_option == 'Release Year':
-                    year_list = game.release_date.split()
-                    year = year_list[-1]
-                    if int(query) == int(year):
-                        filtered_games.append(game)
-
-        if price_filter:
-            filtered_by_price = []
-            for price_range in price_filter:
-                a_list = price_range.split('-')
-                min_price = int(a_list[0])
-                max_price = int(a_list[1])
-                for game in filtered_games:
-                    if min_price <= game.price <= max_price:
-                        filtered_by_price.append(game)
-            return filtered_by_price
-
-        return filtered_games
-
-    def calculate_average_rating(self, game_id,reviews):
-        if not reviews:
+    def calculate_average_rating(self, game_id, reviews):
+        # Read from the counters add_review keeps on the game rather than summing the reviews
+        game = self.get_game_by_id(game_id)
+        if game is None or game.average_rating is None:
             return 0.0  # Return 0 if there are no reviews
-        if isinstance(reviews, (list, tuple)):
-            total_rating = sum(review.rating for review in reviews)
-        else:
-            total_rating = 0  # or any other appropriate default value
-
-        if isinstance(reviews, (list, tuple)):
-            num_reviews = len(reviews)
-        else:
-            num_reviews = 0  # or any other appropriate default value
-
-        if num_reviews == 0:
-            return None  # or return 0 or any other appropriate value
-
-        return total_rating / num_reviews
+        return game.average_rating
 
     def get_games_pagination(self, genre="All", offset=0, limit=10, order_by='title'):
+        rows, _ = self.__get_sorted_view(genre, order_by)
+        return game_row_dicts(rows[offset:offset + limit])
 
-        games = self.get_games_by_genre(genre)
-        sorted_games = sorted(games, key=lambda x: getattr(x, order_by, ""))
-
-        paginated_games = sorted_games[offset:offset + limit]
-
-        game_dicts = []
-        for game in paginated_games:
-            game_dict = {
-                "game_id": game.game_id,
-                "title": game.title,
-                "release_date": game.release_date
-            }
-            game_dicts.append(game_dict)
-
-        return game_dicts
+    def get_games_after(self, genre="All", after=None, limit=10, order_by='title'):
+        rows, keys = self.__get_sorted_view(genre, order_by)
+        if after is None:
+            start = 0
+        else:
+            value, game_id = after
+            start = bisect_right(keys, self.__sort_key(order_by, value, game_id))
+        return game_row_dicts(rows[start:start + limit])
+
+    def get_games_page(self, genre="All", page=1, page_size=10, order_by='title'):
+        # The sorted views are lists, so any page is a direct slice and needs no boundary index
+        return self.get_games_pagination(genre, (max(page, 1) - 1) * page_size, page_size, order_by)
+
+    @staticmethod
+    def __sort_key(order_by: str, value, game_id: int) -> tuple:
+        if order_by == 'release_date':
+            # Chronological, games without a date last
+            return value is None, value or 0, game_id
+        if order_by == 'rating':
+            # Highest average rating first, unrated games last
+            return value is None, -(value or 0), game_id
+        # Only missing values are replaced, so free games and id 0 keep their place; they sort last
+        return value is None, value if value is not None else 0, game_id
+
+    @staticmethod
+    def __sort_value(game: Game, order_by: str):
+        if order_by == 'release_date':
+            return game.release_ordinal
+        if order_by == 'rating':
+            return game.average_rating
+        return getattr(game, order_by, None)
+
+    def __get_sorted_view(self, genre, order_by) -> Tuple[List[tuple], List[tuple]]:
+        order_by = normalise_order_by(order_by)
+        key = (genre, order_by)
+        if key not in self.__sorted_views:
+            keyed = sorted((self.__sort_key(order_by, self.__sort_value(game, order_by), game.game_id), game)
+                           for game in self.get_games_by_genre(genre))
+            # Pages are sliced from plain tuples, the Game objects are not touched per request
+            self.__sorted_views[key] = ([(game.game_id, game.title, game.release_date) for _, game in keyed],
+                                        [sort_key for sort_key, _ in keyed])
+        return self.__sorted_views[key]
 
     # Should I put this in memory repository instead?
     def get_games_by_genre(self, selected_genre: str) -> [Game]:
-        games = self.__games
         if selected_genre == "All":
-            return games
-
-        valid_games = []
-        for game in games:
-            for genre in game.genres:
-                if selected_genre == genre.genre_name:
-                    valid_games.append(game)
-        return valid_games
+            return self.__games
+        # Games of each genre are kept sorted by id as they are added
+        return self.__games_by_genre.get(selected_genre, [])
 
     def get_number_of_games_by_genre(self, genre):
-        return len(self.get_games_by_genre(genre))
+        if genre == "All":
+            return len(self.__games)
+        return len(self.__games_by_genre.get(genre, []))
 
     def get_game_genres(self) -> List[str]:
-        # flatten 3d list into 2d set
-        all_genres = []
-        for game in self.__games:
-            for genre in game.genres:
-                all_genres.append(genre.genre_name)
-
-        # set return will cause error
-        all_genres = sorted(set(all_genres))
-        return all_genres
+        # The genre index already holds every distinct genre name as a key
+        return self.__genre_cache.get(lambda: sorted(self.__games_by_genre))
 
     def add_multiple_games(self, games: List[Game]):
-        pass
+        for game in games:
+            self.add_game(game)
+
     def add_multiple_genres(self, genres: List[Genre]):
-        pass
+        # Genres are only listed once a game uses them, but keep the cache honest
+        self.__genre_cache.invalidate()
+
     def add_multiple_publishers(self, publisher: List[Publisher]):
         pass
     def add_publisher(self, publisher: Publisher):
         pass
     def get_game(self, game_id: int) -> Game:
-        pass
+        return self.get_game_by_id(game_id)
     def get_genres(self, genre: Genre) -> List[Genre]:
         pass
     def get_number_of_publishers(self):
@@ -214,7 +242,8 @@ class MemoryRepository(AbstractRepository):
         pass
 
 
-def load_games(repo: AbstractRepository, data_path: Path = None):
+def load_games(repo: AbstractRepository, data_path: Path = None, batch_size: int = 1000, processes: int = 1,
+               lazy_details: bool = False):
 
     # Current fallback otherwise a lot of things will fail
     if data_path is None:
@@ -223,16 +252,39 @@ def load_games(repo: AbstractRepository, data_path: Path = None):
     else:
         games_file_name = str(Path(data_path) / "games.csv")
 
-    reader = GameFileCSVReader(games_file_name)
-    reader.read_csv_file()
+    # A snapshot of an earlier parse of the same CSV is much faster to load than the CSV itself. It holds the
+    # repository's indexes as well, so the games do not have to be added one by one
+    catalogue = load_snapshot(games_file_name, lazy_details)
+    if catalogue is not None:
+        if isinstance(repo, MemoryRepository):
+            repo.restore_catalogue_state(catalogue)
+        else:
+            repo.add_multiple_games(catalogue['games'])
+        return
+
+    # Only a repository that held nothing else can be saved as the snapshot of this CSV
+    snapshot_repo = isinstance(repo, MemoryRepository) and repo.get_number_of_games() == 0
+
+    # Stream the CSV into the repository batch by batch, keeping only references for the snapshot
+    reader = GameFileCSVReader(games_file_name, lazy_details)
+    if processes > 1:
+        game_batches = reader.iter_game_batches_parallel(processes)
+    else:
+        game_batches = reader.iter_game_batches(batch_size)
+    games = []
+    for batch in game_batches:
+        repo.add_multiple_games(batch)
+        games.extend(batch)
 
-    games = reader.dataset_of_games
-    for game in games:
-        repo.add_game(game)
+    if os.path.exists(games_file_name):
+        # Stored in id order so a repository that adds them can append instead of inserting into the middle
+        catalogue = repo.catalogue_state() if snapshot_repo else {'games': sorted(games)}
+        write_snapshot(games_file_name, catalogue, lazy_details)
 
 
-def populate2(repo: AbstractRepository, data_path: Path = None):
-    load_games(repo, data_path)
+def populate2(repo: AbstractRepository, data_path: Path = None, batch_size: int = 1000, processes: int = 1,
+              lazy_details: bool = False):
+    load_games(repo, data_path, batch_size, processes, lazy_details)
 
 
 
@@ -1,8 +1,13 @@
+from datetime import datetime
+from types import MemberDescriptorType
+from typing import List
+
 from sqlalchemy import (
-    Table, MetaData, Column, Integer, String, Text, Float, ForeignKey, DateTime
+    Table, MetaData, Column, Index, Integer, String, Text, Float, ForeignKey, DateTime, event, func, inspect, select,
+    update, bindparam
 )
-from sqlalchemy.orm import registry, mapper, relationship
-from games.domainmodel.model import Game, User, Genre, Review, Publisher
+from sqlalchemy.orm import registry, mapper, relationship, clear_mappers
+from games.domainmodel.model import Game, User, Genre, Review, Publisher, OrderedSet
 
 mapper_registry = registry()
 
@@ -17,11 +22,20 @@ games_table = Table(
     'games', metadata,
     Column('game_id', Integer, primary_key=True),
     Column('game_title', Text, nullable=False),
-    Column('game_price', Float, nullable=False),
+    Column('game_price', Float, nullable=False, index=True),
     Column('release_date', String(50), nullable=False),
+    # Day number of release_date (date.toordinal()), so dates compare and sort as integers
+    Column('release_ordinal', Integer, nullable=True, index=True),
     Column('game_description', String(255), nullable=True),
     Column('game_image_url', String(255), nullable=True),
-    Column('publisher_name', ForeignKey('publishers.name')))
+    Column('publisher_name', ForeignKey('publishers.name')),
+    # Kept up to date by add_review, so the average rating is read rather than computed from the reviews
+    Column('review_count', Integer, nullable=False, default=0, server_default='0'),
+    Column('rating_sum', Integer, nullable=False, default=0, server_default='0'),
+    # Browsing sorts by title; publisher searches and joins look games up by publisher.
+    # Release dates are compared through release_ordinal, so the date string itself needs no index.
+    Index('ix_games_game_title', 'game_title'),
+    Index('ix_games_publisher_name', 'publisher_name'))
 
 genres_table = Table(
     'genres', metadata,
@@ -32,7 +46,11 @@ game_genres_table = Table(
     'game_genres', metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
     Column('game_id', ForeignKey('games.game_id')),
-    Column('genre_name', ForeignKey('genres.genre_name'))
+    Column('genre_name', ForeignKey('genres.genre_name')),
+    # Both directions of the link are covered: the games of a genre (browse, genre counts)
+    # and the genres of a game (loading Game.genres), without touching the table rows
+    Index('ix_game_genres_genre_name_game_id', 'genre_name', 'game_id'),
+    Index('ix_game_genres_game_id_genre_name', 'game_id', 'genre_name')
 )
 
 
@@ -56,7 +74,10 @@ reviews_table = Table(
     Column('comment', String(255), nullable=True),
     Column('rating', Integer, nullable=False),
     Column('user_id', ForeignKey('users.user_id')),
-    Column('game_id', ForeignKey('games.game_id'))
+    Column('game_id', ForeignKey('games.game_id')),
+    # Covers the average rating of a game as well as loading its reviews
+    Index('ix_reviews_game_id_rating', 'game_id', 'rating'),
+    Index('ix_reviews_user_id', 'user_id')
 )
 
 
@@ -67,7 +88,148 @@ user_favorite_games_table = Table(
 )
 
 
+# Full-text index over the games table (SQLite FTS5 with the trigram tokenizer, so that
+# phrase queries behave like case-insensitive substring matches). It is an external content
+# table: the text stays in games and triggers keep the index in sync on every write.
+GAMES_FTS_TABLE = 'games_fts'
+
+GAMES_FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {GAMES_FTS_TABLE} USING fts5(
+        game_title, game_description, publisher_name,
+        content='games', content_rowid='game_id', tokenize='trigram')""",
+    f"""CREATE TRIGGER IF NOT EXISTS games_fts_insert AFTER INSERT ON games BEGIN
+        INSERT INTO {GAMES_FTS_TABLE}(rowid, game_title, game_description, publisher_name)
+        VALUES (new.game_id, new.game_title, new.game_description, new.publisher_name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS games_fts_delete AFTER DELETE ON games BEGIN
+        INSERT INTO {GAMES_FTS_TABLE}({GAMES_FTS_TABLE}, rowid, game_title, game_description, publisher_name)
+        VALUES ('delete', old.game_id, old.game_title, old.game_description, old.publisher_name);
+    END""",
+    # Only changes to the indexed columns touch the index, not e.g. the rating counters add_review updates
+    f"""CREATE TRIGGER IF NOT EXISTS games_fts_update
+        AFTER UPDATE OF game_title, game_description, publisher_name ON games BEGIN
+        INSERT INTO {GAMES_FTS_TABLE}({GAMES_FTS_TABLE}, rowid, game_title, game_description, publisher_name)
+        VALUES ('delete', old.game_id, old.game_title, old.game_description, old.publisher_name);
+        INSERT INTO {GAMES_FTS_TABLE}(rowid, game_title, game_description, publisher_name)
+        VALUES (new.game_id, new.game_title, new.game_description, new.publisher_name);
+    END""",
+]
+
+
+def fts5_available(connection) -> bool:
+    if connection.dialect.name != 'sqlite':
+        return False
+    # The trigram tokenizer was added in SQLite 3.34
+    if connection.dialect.dbapi.sqlite_version_info < (3, 34, 0):
+        return False
+    return bool(connection.exec_driver_sql("SELECT sqlite_compileoption_used('ENABLE_FTS5')").scalar())
+
+
+def games_fts_exists(connection) -> bool:
+    if connection.dialect.name != 'sqlite':
+        return False
+    return connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (GAMES_FTS_TABLE,)
+    ).scalar() is not None
+
+
+def create_games_fts(connection):
+    """ Creates the full-text index and its triggers if the database supports them.
+    Safe to call on existing databases: a newly created index is filled from the games table. """
+    if not fts5_available(connection):
+        return
+    existed = games_fts_exists(connection)
+    for statement in GAMES_FTS_DDL:
+        connection.exec_driver_sql(statement)
+    if not existed:
+        connection.exec_driver_sql(f"INSERT INTO {GAMES_FTS_TABLE}({GAMES_FTS_TABLE}) VALUES ('rebuild')")
+
+
+def drop_games_fts(connection):
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {GAMES_FTS_TABLE}")
+
+
+def add_release_ordinal_column(connection):
+    """ Adds and fills games.release_ordinal in databases created before the column existed. """
+    columns = [column['name'] for column in inspect(connection).get_columns('games')]
+    if 'release_ordinal' in columns:
+        return
+    connection.exec_driver_sql("ALTER TABLE games ADD COLUMN release_ordinal INTEGER")
+    rows = connection.execute(select(games_table.c.game_id, games_table.c.release_date)).all()
+    ordinals = []
+    for game_id, release_date in rows:
+        try:
+            ordinals.append({'id': game_id,
+                             'ordinal': datetime.strptime(release_date, "%b %d, %Y").toordinal()})
+        except (TypeError, ValueError):
+            continue
+    if ordinals:
+        connection.execute(
+            update(games_table).where(games_table.c.game_id == bindparam('id'))
+            .values(release_ordinal=bindparam('ordinal')),
+            ordinals)
+
+
+def add_rating_aggregate_columns(connection):
+    """ Adds games.review_count and games.rating_sum to databases created before the columns existed,
+    filled in from the reviews already stored. """
+    columns = [column['name'] for column in inspect(connection).get_columns('games')]
+    if 'review_count' in columns:
+        return
+    connection.exec_driver_sql("ALTER TABLE games ADD COLUMN review_count INTEGER NOT NULL DEFAULT 0")
+    connection.exec_driver_sql("ALTER TABLE games ADD COLUMN rating_sum INTEGER NOT NULL DEFAULT 0")
+    if not inspect(connection).has_table('reviews'):
+        return
+    totals = connection.execute(
+        select(reviews_table.c.game_id, func.count(), func.sum(reviews_table.c.rating))
+        .group_by(reviews_table.c.game_id)).all()
+    if totals:
+        connection.execute(
+            update(games_table).where(games_table.c.game_id == bindparam('id'))
+            .values(review_count=bindparam('count'), rating_sum=bindparam('total')),
+            [{'id': game_id, 'count': count, 'total': total or 0} for game_id, count, total in totals])
+
+
+def create_missing_indexes(connection) -> List[str]:
+    """ Creates the indexes declared on the tables that an existing database does not have yet, and returns
+    their names. Tables or columns the database lacks are skipped. """
+    inspector = inspect(connection)
+    created = []
+    for table in metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for index in table.indexes:
+            if index.name in existing_indexes or not {column.name for column in index.columns} <= existing_columns:
+                continue
+            index.create(connection)
+            created.append(index.name)
+
+    if created and connection.dialect.name == 'sqlite':
+        # Gives the query planner statistics to choose between the new indexes
+        connection.exec_driver_sql("ANALYZE")
+    return created
+
+
+event.listen(games_table, 'after_create', lambda target, connection, **kw: create_games_fts(connection))
+event.listen(games_table, 'before_drop', lambda target, connection, **kw: drop_games_fts(connection))
+
+
+# The domain classes are slotted. Mapping replaces their slot descriptors with instrumented attributes and
+# clear_mappers() deletes those, which would leave the classes storing everything in __dict__ for the rest of
+# the process. map_model_to_tables keeps the descriptors here and unmap_model puts them back.
+MAPPED_CLASSES = (Publisher, Game, Genre, User, Review)
+_slot_descriptors = {}
+
+
 def map_model_to_tables():
+    for mapped_class in MAPPED_CLASSES:
+        for name, value in vars(mapped_class).items():
+            if isinstance(value, MemberDescriptorType):
+                _slot_descriptors.setdefault((mapped_class, name), value)
+
     mapper_registry.map_imperatively(Publisher, publishers_table, properties={
         '_Publisher__publisher_name': publishers_table.c.name,
     })
@@ -77,6 +239,9 @@ def map_model_to_tables():
         '_Game__game_title': games_table.c.game_title,
         '_Game__price': games_table.c.game_price,
         '_Game__release_date': games_table.c.release_date,
+        '_Game__release_ordinal': games_table.c.release_ordinal,
+        '_Game__review_count': games_table.c.review_count,
+        '_Game__rating_sum': games_table.c.rating_sum,
         '_Game__description': games_table.c.game_description,
         '_Game__image_url': games_table.c.game_image_url,
         '_Game__publisher': relationship(Publisher, backref='games'),
@@ -92,9 +257,11 @@ def map_model_to_tables():
         '_User__user_id': users_table.c.user_id,
         '_User__username': users_table.c.username,
         '_User__password': users_table.c.password,
-        '_User__favourite_games': relationship(Game, secondary=user_favorite_games_table, backref='_Game__favorited_by_users'),
+        '_User__favourite_games': relationship(Game, secondary=user_favorite_games_table, collection_class=OrderedSet,
+                                               backref='_Game__favorited_by_users'),
         '_User__reviews': relationship(Review, back_populates='_Review__user'),
-        '_User__wishlist': relationship(Game, secondary=user_wishlist_table, backref='_Game__wishlisted_by_users')
+        '_User__wishlist': relationship(Game, secondary=user_wishlist_table, collection_class=OrderedSet,
+                                        backref='_Game__wishlisted_by_users')
     })
 
     mapper_registry.map_imperatively(Review, reviews_table, properties={
@@ -104,4 +271,12 @@ def map_model_to_tables():
         '_Review__rating': reviews_table.c.rating,
         '_Review__user': relationship(User, back_populates='_User__reviews'),
         '_Review__game': relationship(Game, back_populates='_Game__reviews')
-    })
\ No newline at end of file
+    })
+
+
+def unmap_model():
+    """ Undoes map_model_to_tables, leaving the domain classes plain slotted classes again.
+    Use it instead of a bare clear_mappers(). """
+    clear_mappers()
+    for (mapped_class, name), descriptor in _slot_descriptors.items():
+        setattr(mapped_class, name, descriptor)
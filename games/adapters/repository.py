@@ -1,5 +1,7 @@
 import abc
-from typing import List
+import threading
+from bisect import bisect_right, insort
+from typing import Callable, Dict, Hashable, List, Tuple
 
 from games.domainmodel.model import Game, User, Genre, Publisher, Review
 
@@ -11,6 +13,127 @@ class RepositoryException(Exception):
         print(f'RepositoryException: {message}')
 
 
+class GenreCache:
+    """ Holds the sorted list of genre names until the catalogue changes.
+    Repositories call invalidate() whenever games or genres are added. """
+
+    def __init__(self):
+        self.__genres = None
+
+    def get(self, load_genres: Callable[[], List[str]]) -> List[str]:
+        if self.__genres is None:
+            self.__genres = load_genres()
+        return self.__genres
+
+    def invalidate(self):
+        self.__genres = None
+
+
+class GenreCountCache:
+    """ Holds the number of games in each genre, and in "All", until the catalogue changes.
+    Repositories call invalidate() whenever games are added. """
+
+    def __init__(self):
+        self.__counts = None
+
+    def get(self, genre: str, load_counts: Callable[[], Dict[str, int]]) -> int:
+        if self.__counts is None:
+            self.__counts = load_counts()
+        return self.__counts.get(genre, 0)
+
+    def invalidate(self):
+        self.__counts = None
+
+
+# Orders that browse pages can be seeked through with a cursor. A cursor is the (sort value, game_id)
+# of the last game before a page: the title, or the release ordinal for 'release_date'.
+KEYSET_ORDERS = ('title', 'release_date')
+
+
+# The fields of the rows listed on browse pages
+GAME_ROW_FIELDS = ("game_id", "title", "release_date")
+
+
+def game_row_dicts(rows) -> List[dict]:
+    """ Turns rows starting with (game_id, title, release_date) into the dicts get_games_pagination returns. """
+    return [dict(zip(GAME_ROW_FIELDS, row)) for row in rows]
+
+
+def normalise_order_by(order_by: str) -> str:
+    # The browse route has always asked for 'game_title', the column name of the title
+    return 'title' if order_by == 'game_title' else order_by
+
+
+class PageBoundaryIndex:
+    """ Remembers the cursors that start pages of a listing, so a page can be fetched by seeking from the
+    nearest known boundary rather than skipping every earlier row with OFFSET. Only every `stride`-th page
+    is kept while walking a listing, plus the page after each page served, so Next links are direct seeks.
+    Repositories call invalidate() whenever games are added.
+    The index is shared by every request thread, so it is guarded by a lock. Boundaries found by a walk that
+    started before an invalidate() are dropped: remember() is given the generation the walk started in. """
+
+    def __init__(self, stride: int = 10):
+        self.__stride = stride
+        self.__pages: Dict[Hashable, List[int]] = dict()
+        self.__cursors: Dict[Hashable, Dict[int, tuple]] = dict()
+        self.__generation = 0
+        self.__lock = threading.Lock()
+
+    @property
+    def stride(self) -> int:
+        return self.__stride
+
+    @property
+    def generation(self) -> int:
+        """ Changes on every invalidate(). """
+        return self.__generation
+
+    def nearest(self, listing: Hashable, page: int) -> Tuple[int, tuple]:
+        """ Returns the closest known page at or before page with its cursor. Page 1 starts at cursor None. """
+        with self.__lock:
+            pages = self.__pages.get(listing, [])
+            position = bisect_right(pages, page)
+            if position == 0:
+                return 1, None
+            known_page = pages[position - 1]
+            return known_page, self.__cursors[listing][known_page]
+
+    def remember(self, listing: Hashable, page: int, cursor: tuple, generation: int = None):
+        with self.__lock:
+            if generation is not None and generation != self.__generation:
+                return
+            cursors = self.__cursors.setdefault(listing, dict())
+            if page not in cursors:
+                insort(self.__pages.setdefault(listing, []), page)
+            cursors[page] = cursor
+
+    def should_keep(self, page: int) -> bool:
+        return page % self.__stride == 1
+
+    def invalidate(self):
+        with self.__lock:
+            self.__pages = dict()
+            self.__cursors = dict()
+            self.__generation += 1
+
+
+def parse_price_ranges(price_filter: List[str]) -> List[Tuple[int, int]]:
+    """ Turns the search form's "min-max" price filters into sorted, non-overlapping (min, max) ranges,
+    so a game that matches several ranges is only returned once. Bounds are inclusive. """
+    ranges = []
+    for price_range in price_filter:
+        min_price, max_price = map(int, price_range.split('-'))
+        ranges.append((min_price, max_price))
+
+    merged = []
+    for min_price, max_price in sorted(ranges):
+        if merged and min_price <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], max_price))
+        else:
+            merged.append((min_price, max_price))
+    return merged
+
+
 class AbstractRepository(abc.ABC):
     @abc.abstractmethod
     def add_game(self, game: Game):
@@ -43,6 +166,16 @@ class AbstractRepository(abc.ABC):
     def get_game_by_id(self, game_id: int):
         raise NotImplementedError
 
+    def get_game_detail(self, game_id: int) -> Game:
+        """ Returns the game with everything its page shows (publisher, genres, reviews and their users)
+        already loaded, or None if there is no such game. """
+        raise NotImplementedError
+
+    def get_user_profile(self, username: str) -> User:
+        """ Returns the user with everything their profile page shows (reviews and their games, favourites
+        and wishlist) already loaded, or None if there is no such user. """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def add_to_user_wishlist(self, username: str, game_id: int):
         raise NotImplementedError
@@ -73,6 +206,15 @@ class AbstractRepository(abc.ABC):
     def get_games_pagination(self, genre="All", offset=0, limit=10, order_by='title'):
         raise NotImplementedError
 
+    def get_games_after(self, genre="All", after=None, limit=10, order_by='title') -> List[dict]:
+        """ Returns up to limit game rows that follow the cursor `after` (see KEYSET_ORDERS), or the first
+        rows if after is None, in the same form as get_games_pagination. """
+        raise NotImplementedError
+
+    def get_games_page(self, genre="All", page=1, page_size=10, order_by='title') -> List[dict]:
+        """ Returns the rows of a numbered page, like get_games_pagination with offset (page - 1) * page_size. """
+        raise NotImplementedError
+
     def get_games_by_genre(self, selected_genre: str) -> [Game]:
         raise NotImplementedError
 
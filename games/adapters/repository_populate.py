@@ -4,23 +4,31 @@ from games.adapters.repository import AbstractRepository
 from games.adapters.datareader.csvdatareader import GameFileCSVReader
 
 
-def populate(data_path: Path, repo: AbstractRepository, database_mode: bool):
+def populate(data_path: Path, repo: AbstractRepository, database_mode: bool, progress=None, batch_size: int = 1000,
+             processes: int = 1):
 
     games_file_name = str(Path(data_path) / "games.csv")
 
     reader = GameFileCSVReader(games_file_name)
 
-    reader.read_csv_file()
+    # Games are streamed from the file in batches so the whole catalogue is never held at once
+    if processes > 1:
+        game_batches = reader.iter_game_batches_parallel(processes)
+    else:
+        game_batches = reader.iter_game_batches(batch_size)
 
-    publishers = list(reader.dataset_of_publishers)
-    genres = list(reader.dataset_of_genres)
-    games = reader.dataset_of_games
+    if database_mode:
+        # Insert straight into the empty tables instead of merging every object one by one
+        stats = repo.bulk_load_catalogue(game_batches, progress)
+        print(f"Loaded {stats['rows']} rows in {stats['seconds']:.2f}s ({stats['rows_per_second']:.0f} rows/sec)")
+        return stats
+
+    # Add games to the repo
+    for games in game_batches:
+        repo.add_multiple_games(games)
 
     # Add publishers to the repo
-    repo.add_multiple_publishers(publishers)
+    repo.add_multiple_publishers(list(reader.dataset_of_publishers))
 
     # Add genres to the repo
-    repo.add_multiple_genres(genres)
-
-    # Add games to the repo
-    repo.add_multiple_games(games)
+    repo.add_multiple_genres(list(reader.dataset_of_genres))
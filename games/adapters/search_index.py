@@ -0,0 +1,163 @@
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date
+from typing import List, Tuple, Union
+
+from games.domainmodel.model import Game
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> set:
+    if not isinstance(text, str):
+        return set()
+    return set(TOKEN_PATTERN.findall(text.lower()))
+
+
+class TokenIndex:
+    """ Inverted index from lowercase word tokens to the ids of the games whose text contains them. """
+
+    def __init__(self):
+        self.__postings = defaultdict(set)
+
+    def add(self, text: str, game_id: int):
+        for token in tokenize(text):
+            self.__postings[token].add(game_id)
+
+    def candidates(self, query: str) -> Union[set, None]:
+        """ Returns the id of every game that could contain query as a substring, or None if the
+        query has no word characters to narrow the search with.
+        Each query token may sit inside a longer indexed word ('acti' in 'activision'),
+        so the posting lists of all matching words are merged before intersecting. """
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+
+        result = None
+        # Longer tokens match fewer words, so intersecting them first keeps the sets small
+        for token in sorted(tokens, key=len, reverse=True):
+            matches = set()
+            for word, game_ids in self.__postings.items():
+                if token in word:
+                    matches |= game_ids
+            result = matches if result is None else result & matches
+            if not result:
+                return set()
+        return result
+
+
+class PriceIndex:
+    """ Game ids sorted by price, so the games in a price range are one slice found by bisecting.
+    Added games are buffered and sorted in once, by the first lookup after a write, so loading a catalogue
+    costs one sort rather than a list insert per game. """
+
+    def __init__(self):
+        # (prices, game ids) in price order, replaced as a whole so lookups always see a matching pair
+        self.__sorted = ([], [])
+        self.__pending = []
+        self.__lock = threading.Lock()
+
+    def __getstate__(self):
+        # Pickled into catalogue snapshots already sorted, without the lock
+        self.__merge_pending()
+        state = self.__dict__.copy()
+        state['_PriceIndex__lock'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+
+    def add(self, game: Game):
+        if game.price is None:
+            return
+        self.__pending.append((game.price, game.game_id))
+
+    def __merge_pending(self):
+        with self.__lock:
+            if not self.__pending:
+                return
+            # Stable, so games of the same price stay in the order they were added
+            prices, game_ids = self.__sorted
+            entries = sorted(list(zip(prices, game_ids)) + self.__pending, key=lambda entry: entry[0])
+            self.__pending = []
+            self.__sorted = ([price for price, _ in entries], [game_id for _, game_id in entries])
+
+    def games_in_ranges(self, ranges: List[Tuple[float, float]]) -> set:
+        """ Returns the ids of the games priced within any of the inclusive (min, max) ranges. """
+        if self.__pending:
+            self.__merge_pending()
+        prices, ids_by_price = self.__sorted
+        game_ids = set()
+        for min_price, max_price in ranges:
+            game_ids.update(ids_by_price[bisect_left(prices, min_price):bisect_right(prices, max_price)])
+        return game_ids
+
+
+class SearchIndex:
+    """ Answers the search form filters (Title, Genre, Publisher, Release Year)
+    without visiting every game in the repository.
+    The indexes hold game ids rather than games: int sets are hashed in C, which keeps building them and
+    unpickling them from a catalogue snapshot cheap. """
+
+    def __init__(self):
+        self.__titles = TokenIndex()
+        self.__publishers = TokenIndex()
+        self.__genres = defaultdict(set)
+        self.__years = defaultdict(set)
+        self.__prices = PriceIndex()
+        self.__games = dict()
+
+    def add_game(self, game: Game):
+        game_id = game.game_id
+        self.__games[game_id] = game
+        self.__prices.add(game)
+        self.__titles.add(game.title, game_id)
+        if game.publisher is not None:
+            self.__publishers.add(game.publisher.publisher_name, game_id)
+        for genre in game.genres:
+            if genre.genre_name is not None:
+                self.__genres[genre.genre_name.lower()].add(game_id)
+        if game.release_ordinal is not None:
+            self.__years[date.fromordinal(game.release_ordinal).year].add(game_id)
+
+    def search(self, query: str, filter_option: str, price_ranges: List[Tuple[float, float]] = None) -> List[Game]:
+        """ price_ranges, if given, are non-overlapping inclusive (min, max) ranges a game's price must fall in. """
+        query = query.lower()
+        priced = self.__prices.games_in_ranges(price_ranges) if price_ranges else None
+
+        if filter_option == 'Title':
+            game_ids = self.__substring_matches(self.__titles, query, lambda game: game.title, priced)
+        elif filter_option == 'Genre':
+            game_ids = self.__genres.get(query, set())
+        elif filter_option == 'Publisher':
+            game_ids = self.__substring_matches(
+                self.__publishers, query,
+                lambda game: game.publisher.publisher_name if game.publisher is not None else None, priced)
+        elif filter_option == 'Release Year' and query.isdigit():
+            game_ids = self.__years.get(int(query), set())
+        else:
+            game_ids = set()
+
+        if priced is not None:
+            game_ids = game_ids & priced
+
+        # Results are listed in game id order, like the repository itself
+        return [self.__games[game_id] for game_id in sorted(game_ids)]
+
+    def __substring_matches(self, index: TokenIndex, query: str, text_of, within: set = None) -> set:
+        candidates = index.candidates(query)
+        if candidates is None:
+            candidates = self.__games.keys()
+        if within is not None:
+            candidates = candidates & within
+
+        # The token index over-approximates, so confirm the exact substring match
+        matches = set()
+        for game_id in candidates:
+            text = text_of(self.__games[game_id])
+            if text is not None and query in text.lower():
+                matches.add(game_id)
+        return matches
@@ -7,11 +7,17 @@ from games.browse import services
 
 browse_blueprint = Blueprint('games_bp', __name__)
 
+# The orders a browse page can be sorted by, the first is the default
+BROWSE_ORDERS = ('title', 'release_date', 'rating')
+
 
 @browse_blueprint.route('/browse/<browse_genre>', methods=['GET', 'POST'])
 @browse_blueprint.route('/browse/<browse_genre>/<int:page>', methods=['GET', 'POST'])
 def browse_games(page=1, browse_genre="All"):
     page_size = 10
+    order_by = request.args.get('order_by', BROWSE_ORDERS[0])
+    if order_by not in BROWSE_ORDERS:
+        order_by = BROWSE_ORDERS[0]
 
     # Redo replacement from genre_sidebar.html so page can actually load
     browse_genre = browse_genre.replace("_", " ")
@@ -34,11 +40,9 @@ def browse_games(page=1, browse_genre="All"):
             # flash("Please enter a valid number")
 
 
-    # Calculate the offset for pagination
-    offset = (page - 1) * page_size
-
-    # Fetch games for the current page
-    current_page_games = services.get_games_pagination(repo.repo_instance, genre=browse_genre, offset=offset, limit=page_size, order_by='game_title')
+    # Fetch games for the current page, seeking from a known page boundary rather than skipping earlier games
+    current_page_games = services.get_games_page(repo.repo_instance, genre=browse_genre, page=page,
+                                                 page_size=page_size, order_by=order_by)
 
 
     # Fetch all genres for the genre sidebar
@@ -54,5 +58,6 @@ def browse_games(page=1, browse_genre="All"):
         total_pages=total_pages,
         genres=game_genres,
         current_genre=browse_genre,
+        order_by=order_by,
         current_user=u.get_current_user()
     )
@@ -8,6 +8,10 @@ def get_games_pagination(repo: AbstractRepository, genre="All", offset=0, limit=
     return repo.get_games_pagination(genre, offset, limit, order_by)
 
 
+def get_games_page(repo: AbstractRepository, genre="All", page=1, page_size=10, order_by='title'):
+    return repo.get_games_page(genre, page, page_size, order_by)
+
+
 def get_game_genres(repo: AbstractRepository) -> List[str]:
     return repo.get_game_genres()
 
@@ -1,7 +1,46 @@
-from datetime import datetime
+from datetime import date, datetime
+from itertools import islice
+from typing import Callable, Iterable, Union
+
+
+class OrderedSet:
+    """ A set that iterates in insertion order, backed by the keys of a dict. Used for favourites and
+    wishlists, and by orm.py as the collection class of the matching relationships. """
+
+    def __init__(self, items: Iterable = ()):
+        self.__items = dict.fromkeys(items)
+
+    def add(self, item):
+        self.__items[item] = None
+
+    def remove(self, item):
+        del self.__items[item]
+
+    def discard(self, item):
+        self.__items.pop(item, None)
+
+    def __contains__(self, item) -> bool:
+        return item in self.__items
+
+    def __iter__(self):
+        return iter(self.__items)
+
+    def __len__(self) -> int:
+        return len(self.__items)
+
+    def __repr__(self):
+        return f"OrderedSet({list(self.__items)})"
+
+
+# The domain classes use __slots__ so that the many instances held by the memory repository do not
+# each carry an instance dict. '__dict__' stays in the slots because the imperative SQLAlchemy mapping
+# in orm.py keeps its state in the instance dict; it is only allocated for mapped instances.
+# '__weakref__' is needed by the session's identity map.
 
 
 class Publisher:
+    __slots__ = ('__publisher_name', '__dict__', '__weakref__')
+
     def __init__(self, publisher_name: str):
         if publisher_name == "" or type(publisher_name) is not str:
             self.__publisher_name = None
@@ -24,6 +63,8 @@ class Publisher:
         return f'<Publisher {self.__publisher_name}>'
 
     def __eq__(self, other):
+        if other is self:
+            return True
         if not isinstance(other, self.__class__):
             return False
         return other.publisher_name == self.__publisher_name
@@ -38,6 +79,8 @@ class Publisher:
 
 
 class Genre:
+    __slots__ = ('__genre_name', '__dict__', '__weakref__')
+
     def __init__(self, genre_name: str):
         if genre_name == "" or type(genre_name) is not str:
             self.__genre_name = None
@@ -52,6 +95,8 @@ class Genre:
         return f'<Genre {self.__genre_name}>'
 
     def __eq__(self, other) -> bool:
+        if other is self:
+            return True
         if not isinstance(other, self.__class__):
             return False
         return other.genre_name == self.__genre_name
@@ -66,6 +111,13 @@ class Genre:
 
 
 class Game:
+    # __details_loader is set by readers that leave descriptions and screenshots in the CSV,
+    # loader(game_id, field) returns 'description' or 'image_url' of a game.
+    # __reviews is only created when a game gets its first review.
+    __slots__ = ('__game_id', '__game_title', '__price', '__release_date', '__release_ordinal', '__description',
+                 '__image_url', '__website_url', '__genres', '__reviews', '__review_count', '__rating_sum',
+                 '__publisher', '__details_loader', '__dict__', '__weakref__')
+
     def __init__(self, game_id: int, game_title: str):
         if type(game_id) is not int or game_id < 0:
             raise ValueError("Game ID should be a positive integer!")
@@ -78,12 +130,15 @@ class Game:
 
         self.__price = None
         self.__release_date = None
+        self.__release_ordinal = None
         self.__description = None
         self.__image_url = None
         self.__website_url = None
         self.__genres: list = []
-        self.__reviews: list = []
+        self.__review_count = 0
+        self.__rating_sum = 0
         self.__publisher = None
+        self.__details_loader = None
 
     @property
     def publisher(self) -> Publisher:
@@ -131,15 +186,23 @@ class Game:
         if isinstance(release_date, str):
             try:
                 # Check if the release_date string is in the correct date format (e.g., "Oct 21, 2008")
-                datetime.strptime(release_date, "%b %d, %Y")
+                parsed = datetime.strptime(release_date, "%b %d, %Y")
                 self.__release_date = release_date
+                self.__release_ordinal = parsed.toordinal()
             except ValueError:
                 raise ValueError("Release date must be in 'Oct 21, 2008' format!")
         else:
             raise ValueError("Release date must be a string in 'Oct 21, 2008' format!")
 
+    @property
+    def release_ordinal(self):
+        """ The release date as a date.toordinal() day number, for comparing and sorting dates as integers. """
+        return self.__release_ordinal
+
     @property
     def description(self):
+        if self.__description is None:
+            return self.__load_detail('description')
         return self.__description
 
     @description.setter
@@ -149,8 +212,20 @@ class Game:
         else:
             self.__description = None
 
+    def set_details_loader(self, loader: Callable[[int, str], str]):
+        """ Leaves description and image_url to loader(game_id, field), asked on every read unless
+        a value has been set on the game. The loader is shared by all games of a reader and does its own caching. """
+        self.__details_loader = loader
+
+    def __load_detail(self, field: str):
+        # Games loaded by SQLAlchemy skip __init__, so the slot may never have been set
+        loader = getattr(self, '_Game__details_loader', None)
+        return loader(self.__game_id, field) if loader is not None else None
+
     @property
     def image_url(self):
+        if self.__image_url is None:
+            return self.__load_detail('image_url')
         return self.__image_url
 
     @image_url.setter
@@ -173,12 +248,37 @@ class Game:
 
     @property
     def reviews(self) -> list:
-        return self.__reviews
+        try:
+            return self.__reviews
+        except AttributeError:
+            self.__reviews = []
+            return self.__reviews
 
     def add_review(self, review):
         if not isinstance(review, Review):
             raise ValueError("Review must be an instance of Review class")
-        self.__reviews.append(review)
+        self.reviews.append(review)
+
+    @property
+    def review_count(self) -> int:
+        return self.__review_count
+
+    @property
+    def rating_sum(self) -> int:
+        return self.__rating_sum
+
+    @property
+    def average_rating(self) -> Union[float, None]:
+        """ The mean rating of the game's stored reviews, or None before its first review. """
+        if not self.__review_count:
+            return None
+        return self.__rating_sum / self.__review_count
+
+    def record_rating(self, rating: int):
+        """ Counts a stored review's rating into review_count and rating_sum. Called by repositories when
+        they store a review, so the average never has to be recomputed from the reviews. """
+        self.__review_count += 1
+        self.__rating_sum += rating
 
     @property
     def genres(self) -> list:
@@ -216,6 +316,9 @@ class Game:
 
 
 class User:
+    __slots__ = ('__username', '__password', '__reviews', '__favourite_games', '_wishlist', 'authenticated', 'active',
+                 '__dict__', '__weakref__')
+
     def __init__(self, username: str, password: str):
         if not isinstance(username, str) or username.strip() == "":
             raise ValueError('Username cannot be empty or non-string!')
@@ -229,8 +332,8 @@ class User:
             raise ValueError('Password not valid!')
 
         self.__reviews: list[Review] = []
-        self.__favourite_games: list[Game] = []
-        self._wishlist = []
+        self.__favourite_games = OrderedSet()
+        self._wishlist = OrderedSet()
         self.authenticated = False
         self.active = True
 
@@ -258,17 +361,17 @@ class User:
 
     @property
     def favourite_games(self) -> list:
-        return self.__favourite_games
+        return list(self.__favourite_games)
 
     def add_favourite_game(self, game):
-        if not isinstance(game, Game) or game in self.__favourite_games:
+        if not isinstance(game, Game):
             return
-        self.__favourite_games.append(game)
+        self.__favourite_games.add(game)
 
     def remove_favourite_game(self, game):
-        if not isinstance(game, Game) or game not in self.__favourite_games:
+        if not isinstance(game, Game):
             return
-        self.__favourite_games.remove(game)
+        self.__favourite_games.discard(game)
 
     def __repr__(self):
         return f"<User {self.__username}>"
@@ -288,15 +391,13 @@ class User:
 
     @property
     def wishlist(self):
-        return self._wishlist
+        return list(self._wishlist)
 
     def add_to_wishlist(self, game_id):
-        if game_id not in self._wishlist:
-            self._wishlist.append(game_id)
+        self._wishlist.add(game_id)
 
     def remove_from_wishlist(self, game_id):
-        if game_id in self._wishlist:
-            self._wishlist.remove(game_id)
+        self._wishlist.discard(game_id)
 
     @property
     def is_authenticated(self):
@@ -317,6 +418,8 @@ class User:
 
 
 class Review:
+    __slots__ = ('__user', '__game', '__rating', '__comment', '__timestamp', '__dict__', '__weakref__')
+
     def __init__(self, user: User, game: Game, rating: int, comment: str):
 
         if not isinstance(user, User):
@@ -390,46 +493,82 @@ class Wishlist:
             raise ValueError("User must be an instance of User class")
         self.__user = user
 
-        self.__list_of_games = []
+        self.__games = OrderedSet()
 
     def list_of_games(self):
-        return self.__list_of_games
+        return list(self.__games)
 
     def size(self):
-        size_wishlist = len(self.__list_of_games)
+        size_wishlist = len(self.__games)
         if size_wishlist > 0:
             return size_wishlist
 
     def add_game(self, game: Game):
-        if isinstance(game, Game) and game not in self.__list_of_games:
-            self.__list_of_games.append(game)
+        if isinstance(game, Game):
+            self.__games.add(game)
 
     def first_game_in_list(self):
-        if len(self.__list_of_games) > 0:
-            return self.__list_of_games[0]
-        else:
-            return None
+        return next(iter(self.__games), None)
 
     def remove_game(self, game):
-        if isinstance(game, Game) and game in self.__list_of_games:
-            self.__list_of_games.remove(game)
+        if isinstance(game, Game):
+            self.__games.discard(game)
 
     def select_game(self, index):
-        if 0 <= index < len(self.__list_of_games):
-            return self.__list_of_games[index]
+        if 0 <= index < len(self.__games):
+            return next(islice(self.__games, index, None))
         else:
             return None
 
-    def __iter__(self):
-        self.__current = 0
-        return self
+    def __contains__(self, game) -> bool:
+        return game in self.__games
 
-    def __next__(self):
-        if self.__current >= len(self.__list_of_games):
-            raise StopIteration
-        else:
-            self.__current += 1
-            return self.__list_of_games[self.__current - 1]
+    def __len__(self) -> int:
+        return len(self.__games)
+
+    def __iter__(self):
+        return iter(self.__games)
+
+
+def year_ordinal_range(year: int) -> tuple:
+    """ Returns the [start, end) range of release ordinals that fall in a year. """
+    return date(year, 1, 1).toordinal(), date(year + 1, 1, 1).toordinal()
+
+
+class InternRegistry:
+    """ Hands out one shared Publisher and Genre instance per name, so games read from the same
+    catalogue do not each hold their own copies and equal instances usually compare by identity. """
+
+    def __init__(self):
+        self.__publishers = dict()
+        self.__genres = dict()
+
+    def publisher(self, publisher_name: str) -> Publisher:
+        return self.__intern(self.__publishers, publisher_name, Publisher)
+
+    def genre(self, genre_name: str) -> Genre:
+        return self.__intern(self.__genres, genre_name, Genre)
+
+    def intern_game(self, game: Game) -> Game:
+        """ Swaps the publisher and genres of a game built elsewhere (e.g. unpickled from another process)
+        for the shared instances. """
+        if game.publisher is not None:
+            game.publisher = self.__intern(self.__publishers, game.publisher, Publisher)
+        genres = game.genres
+        for index, genre in enumerate(genres):
+            genres[index] = self.__intern(self.__genres, genre, Genre)
+        return game
+
+    @staticmethod
+    def __intern(instances: dict, key, factory):
+        # Keyed by both the raw name and the instance itself, so names that only differ in
+        # surrounding whitespace still end up on the same instance
+        instance = instances.get(key)
+        if instance is None:
+            instance = key if isinstance(key, factory) else factory(key)
+            instance = instances.setdefault(instance, instance)
+            instances[key] = instance
+        return instance
 
 
 def add_review(comment: str, rating: int, game: Game, user: User):
@@ -16,7 +16,8 @@ game_description_blueprint = Blueprint('game_description_bp', __name__)
 # Although game_title is unused in function, it is used in the URL
 @game_description_blueprint.route('/<game_title>/<int:game_id>', methods=['GET'])
 def game_description(game_id, game_title):
-    game = services.get_game_by_id(repo.repo_instance, game_id)
+    # Publisher, genres and reviews with their users come with the game, not one query each
+    game = services.get_game_detail(repo.repo_instance, game_id)
     if not game:
         return "Game not found", 404
 
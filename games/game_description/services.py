@@ -15,6 +15,10 @@ def get_game_by_id(repo: AbstractRepository, game_id: int):
     return repo.get_game_by_id(game_id)
 
 
+def get_game_detail(repo: AbstractRepository, game_id: int):
+    return repo.get_game_detail(game_id)
+
+
 def get_user(repo: AbstractRepository, username: str) -> Union[User, None]:
     return repo.get_user(username)
 
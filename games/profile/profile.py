@@ -10,14 +10,16 @@ profile_blueprint = Blueprint('profile_bp', __name__)
 @profile_blueprint.route('/<user_name>/profile', methods=["GET", "POST"])
 @login_required
 def user_profile(user_name):
-    user = services.get_user(repo.repo_instance, user_name)
+    # Reviews with their games, favourites and wishlist come with the user, not one query each
+    user = services.get_user_profile(repo.repo_instance, user_name)
     rated_games = user.favourite_games
     reviews = user.reviews
     current_user_name = u.get_current_user()
-    currentuser = services.get_user(repo.repo_instance, current_user_name)
+    if current_user_name == user_name:
+        currentuser = user
+    else:
+        currentuser = services.get_user_profile(repo.repo_instance, current_user_name)
     wishlist = services.get_wishlist(repo.repo_instance, currentuser)
-    current_user_name = u.get_current_user()
-    currentuser = services.get_user(repo.repo_instance, current_user_name)
     favorite_games = services.get_favs(repo.repo_instance, currentuser)
     fav_games_length = len(favorite_games)
     wishlist_length = len(wishlist)
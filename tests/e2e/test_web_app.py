@@ -160,6 +160,18 @@ def test_browse_page_pagination(client, auth):
     assert "Release Date" in table_headings
 
 
+@pytest.mark.parametrize('order_by', ['title', 'release_date', 'rating', 'unknown'])
+def test_browse_page_sort_orders(client, order_by):
+    response = client.get(f'/browse/All/2?order_by={order_by}')
+    assert response.status_code == 200
+
+    soup = BeautifulSoup(response.data, 'html.parser')
+    assert len(soup.select('#games tbody tr')) == 10
+    # Page links keep the order
+    expected = order_by if order_by != 'unknown' else 'title'
+    assert all(f'order_by={expected}' in link['href'] for link in soup.select('a.page-link'))
+
+
 def test_add_remove_wishlist(client, auth):
     auth.login()
     # Assuming '1' is a valid game ID
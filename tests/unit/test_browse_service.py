@@ -1,6 +1,8 @@
 import pytest
 from unittest.mock import Mock
-from games.adapters.repository import AbstractRepository
+import threading
+
+from games.adapters.repository import AbstractRepository, PageBoundaryIndex
 from games.domainmodel.model import Game, Genre
 from games.browse import services
 from flask import Flask
@@ -76,3 +78,137 @@ def test_get_games_pagination_with_genre(memory_repo):
             assert len(result) == 1
             assert result[0]["game_id"] == 1
 
+
+
+def test_get_number_of_games_by_genre(memory_repo):
+    assert services.get_number_of_games_by_genre(memory_repo, "Adventure") == 2
+    assert services.get_number_of_games_by_genre(memory_repo, "Puzzle") == 1
+    assert services.get_number_of_games_by_genre(memory_repo, "All") == 3
+    assert services.get_number_of_games_by_genre(memory_repo, "Unknown Genre") == 0
+
+
+def test_genre_index_updated_on_add_game(memory_repo):
+    game0 = Game(0, "Game 0")
+    game0.add_genre(Genre("Adventure"))
+    memory_repo.add_game(game0)
+
+    result = memory_repo.get_games_by_genre("Adventure")
+    assert [game.game_id for game in result] == [0, 1, 2]
+    assert memory_repo.get_number_of_games_by_genre("Adventure") == 3
+
+
+def test_get_games_pagination_order_by_title(memory_repo):
+    result = memory_repo.get_games_pagination(offset=0, limit=3, order_by='title')
+    assert [game["title"] for game in result] == ["Game 1", "Game 2", "Game 3"]
+
+    # Adding a game refreshes the sorted view
+    memory_repo.add_game(Game(4, "A Game"))
+    result = memory_repo.get_games_pagination(offset=0, limit=2, order_by='title')
+    assert [game["title"] for game in result] == ["A Game", "Game 1"]
+
+
+def test_get_games_pagination_order_by_release_date():
+    repo = MemoryRepository()
+    for game_id, release_date in ((1, "Feb 01, 2010"), (2, "Jan 15, 2009"), (3, None), (4, "Dec 31, 2009")):
+        game = Game(game_id, f"Game {game_id}")
+        if release_date is not None:
+            game.release_date = release_date
+        repo.add_game(game)
+
+    # Chronological rather than by the text of the date, undated games last
+    result = repo.get_games_pagination(offset=0, limit=4, order_by='release_date')
+    assert [game["game_id"] for game in result] == [2, 4, 1, 3]
+
+
+def test_get_games_pagination_order_by_price_with_free_games():
+    repo = MemoryRepository()
+    for game_id, price in ((1, 9.99), (2, 0.0), (3, 4.99), (4, 0)):
+        game = Game(game_id, f"Game {game_id}")
+        game.price = price
+        repo.add_game(game)
+    repo.add_game(Game(5, "Game 5"))
+
+    # Free games are cheapest rather than treated as missing, games without a price last
+    result = repo.get_games_pagination(offset=0, limit=5, order_by='price')
+    assert [game["game_id"] for game in result] == [2, 4, 3, 1, 5]
+
+    populate(repo)
+    result = repo.get_games_pagination(offset=0, limit=1000, order_by='price')
+    prices = [repo.get_game(game["game_id"]).price for game in result]
+    assert prices[0] == 0 and prices == sorted(prices, key=lambda price: (price is None, price or 0))
+
+
+def test_get_games_pagination_order_by_game_id_from_zero():
+    repo = MemoryRepository()
+    for game_id in (2, 0, 1):
+        repo.add_game(Game(game_id, f"Game {game_id}"))
+
+    result = repo.get_games_pagination(offset=0, limit=3, order_by='game_id')
+    assert [game["game_id"] for game in result] == [0, 1, 2]
+
+
+def test_get_games_after_matches_offset_pages():
+    repo = MemoryRepository()
+    populate(repo)
+
+    for order_by in ('title', 'release_date'):
+        offset_games = repo.get_games_pagination(offset=0, limit=1000, order_by=order_by)
+        keyset_games, after = [], None
+        while True:
+            page = repo.get_games_after(after=after, limit=10, order_by=order_by)
+            if not page:
+                break
+            keyset_games.extend(page)
+            last = repo.get_game(page[-1]["game_id"])
+            after = (last.title if order_by == 'title' else last.release_ordinal, last.game_id)
+        assert [game["game_id"] for game in keyset_games] == [game["game_id"] for game in offset_games]
+        assert services.get_games_page(repo, page=7, order_by=order_by) == offset_games[60:70]
+
+
+def test_page_boundary_index_invalidation():
+    index = PageBoundaryIndex()
+    listing = ("All", 'title', 10)
+    generation = index.generation
+    index.remember(listing, 11, ("M", 5), generation)
+    assert index.nearest(listing, 15) == (11, ("M", 5))
+    assert index.nearest(listing, 3) == (1, None)
+
+    index.invalidate()
+    assert index.nearest(listing, 15) == (1, None)
+    # Boundaries found by a walk that started before the invalidation are dropped
+    index.remember(listing, 11, ("M", 5), generation)
+    assert index.nearest(listing, 15) == (1, None)
+
+
+def test_page_boundary_index_shared_by_threads():
+    index = PageBoundaryIndex()
+    listing = ("All", 'title', 10)
+    errors = []
+
+    def browse():
+        try:
+            for page in range(1, 2000):
+                index.remember(listing, page, ("title", page), index.generation)
+                index.nearest(listing, page)
+        except Exception as e:
+            errors.append(e)
+
+    def write():
+        for _ in range(2000):
+            index.invalidate()
+
+    threads = [threading.Thread(target=browse) for _ in range(4)] + [threading.Thread(target=write)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def test_get_game_genres_refreshed_on_add_game(memory_repo):
+    assert services.get_game_genres(memory_repo) == ["Action", "Adventure", "Puzzle", "RPG", "Strategy"]
+
+    game4 = Game(4, "Game 4")
+    game4.add_genre(Genre("Casual"))
+    memory_repo.add_game(game4)
+    assert services.get_game_genres(memory_repo) == ["Action", "Adventure", "Casual", "Puzzle", "RPG", "Strategy"]
@@ -0,0 +1,136 @@
+import os
+import random
+import shutil
+from pathlib import Path
+
+import pytest
+
+from games.adapters.datareader import catalogue_snapshot
+from games.adapters.datareader.catalogue_snapshot import load_snapshot, write_snapshot, snapshot_path
+from games.adapters.datareader.csvdatareader import GameFileCSVReader
+from games.adapters.memory_repository import MemoryRepository, populate2
+from games.domainmodel.model import Game, Genre
+
+TEST_DATA_PATH = Path(__file__).parent.parent / "data"
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    shutil.copy(TEST_DATA_PATH / "games.csv", tmp_path / "games.csv")
+    return str(tmp_path / "games.csv")
+
+
+def read_games(csv_file):
+    reader = GameFileCSVReader(csv_file)
+    reader.read_csv_file()
+    return reader.dataset_of_games
+
+
+def read_catalogue(csv_file):
+    return {'games': sorted(read_games(csv_file))}
+
+
+def test_snapshot_round_trip(csv_file):
+    games = read_games(csv_file)
+    assert load_snapshot(csv_file) is None
+
+    write_snapshot(csv_file, {'games': sorted(games)})
+    loaded = load_snapshot(csv_file)['games']
+
+    assert loaded == sorted(games)
+    assert [game.title for game in loaded] == [game.title for game in sorted(games)]
+    assert [game.publisher for game in loaded] == [game.publisher for game in sorted(games)]
+
+
+def test_snapshot_ignored_when_csv_changes(csv_file):
+    write_snapshot(csv_file, read_catalogue(csv_file))
+
+    with open(csv_file, 'a', encoding='utf-8') as file:
+        file.write("\n")
+    assert load_snapshot(csv_file) is None
+
+
+def test_snapshot_survives_touching_csv(csv_file):
+    write_snapshot(csv_file, read_catalogue(csv_file))
+
+    # Same content with a new mtime is recognised through the hash
+    stat = os.stat(csv_file)
+    os.utime(csv_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert load_snapshot(csv_file) is not None
+
+
+def test_snapshot_ignored_after_version_change(csv_file, monkeypatch):
+    write_snapshot(csv_file, read_catalogue(csv_file))
+
+    monkeypatch.setattr(catalogue_snapshot, 'SNAPSHOT_VERSION', catalogue_snapshot.SNAPSHOT_VERSION + 1)
+    assert load_snapshot(csv_file) is None
+
+
+def test_damaged_snapshot_falls_back_to_csv(csv_file, tmp_path):
+    repo = MemoryRepository()
+    populate2(repo, tmp_path)
+    path = snapshot_path(csv_file)
+    with open(path, 'rb') as file:
+        intact = file.read()
+    # Only the snapshot itself is left behind, workers write to their own temporary files
+    assert sorted(os.listdir(tmp_path)) == ["games.csv", "games.csv.snapshot"]
+
+    rng = random.Random(10)
+    for _ in range(50):
+        damaged = bytearray(intact)
+        start = rng.randrange(len(damaged))
+        end = min(len(damaged), start + rng.randint(1, 64))
+        damaged[start:end] = bytes(rng.randrange(256) for _ in range(end - start))
+        with open(path, 'wb') as file:
+            file.write(damaged)
+
+        # Whatever the damage, loading never raises; a snapshot that cannot be read is removed
+        if load_snapshot(csv_file) is None:
+            assert not os.path.exists(path)
+
+    with open(path, 'wb') as file:
+        file.write(intact[:len(intact) // 2])
+    fallback_repo = MemoryRepository()
+    populate2(fallback_repo, tmp_path)
+    assert fallback_repo.get_games() == repo.get_games()
+    assert load_snapshot(csv_file) is not None
+
+
+def test_populate_writes_and_uses_snapshot(csv_file, tmp_path):
+    repo = MemoryRepository()
+    populate2(repo, tmp_path)
+    assert os.path.exists(snapshot_path(csv_file))
+
+    snapshot_repo = MemoryRepository()
+    populate2(snapshot_repo, tmp_path)
+    assert snapshot_repo.get_games() == repo.get_games()
+    assert snapshot_repo.get_game_genres() == repo.get_game_genres()
+    assert snapshot_repo.search_games('', 'Title', ["0-10"]) == repo.search_games('', 'Title', ["0-10"])
+
+
+def test_snapshot_restores_repository_indexes(csv_file, tmp_path):
+    populate2(MemoryRepository(), tmp_path)
+    assert set(load_snapshot(csv_file)) >= {'games', 'games_by_id', 'games_by_genre', 'search_index'}
+
+    repo = MemoryRepository()
+    populate2(repo, tmp_path)
+    game = repo.get_games()[0]
+    assert repo.get_game_by_id(game.game_id) is game
+    assert repo.search_games(game.title, 'Title', []) == [game]
+    genre = game.genres[0].genre_name
+    assert game in repo.get_games_by_genre(genre)
+    assert repo.get_number_of_games_by_genre(genre) == len(repo.get_games_by_genre(genre))
+
+    # The restored indexes keep following new games
+    new_game = Game(10 ** 9, "Snapshot Follow Up")
+    new_game.price = 1.0
+    new_game.add_genre(Genre(genre))
+    repo.add_game(new_game)
+    assert repo.search_games('follow up', 'Title', ["0-2"]) == [new_game]
+    assert repo.get_games_by_genre(genre)[-1] is new_game
+
+    # A repository that already holds games adds the snapshot's games to its own
+    other = MemoryRepository()
+    other.add_game(new_game)
+    populate2(other, tmp_path)
+    assert other.get_number_of_games() == repo.get_number_of_games()
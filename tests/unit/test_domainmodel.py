@@ -1,7 +1,12 @@
+import csv
+import datetime
+import io
+import pickle
 import pytest
 import os
-from games.domainmodel.model import Publisher, Genre, Game, Review, User, Wishlist
-from games.adapters.datareader.csvdatareader import GameFileCSVReader
+from games.domainmodel.model import (Publisher, Genre, Game, InternRegistry, OrderedSet, Review, User, Wishlist,
+                                     year_ordinal_range)
+from games.adapters.datareader.csvdatareader import CSVRecordStore, GameFileCSVReader, split_csv_records
 
 
 def test_publisher_init():
@@ -226,6 +231,40 @@ def test_game_lt():
     assert sorted(genre_list) == [game1, game2, game3]
 
 
+def test_game_release_ordinal():
+    game = Game(1, "Dated game")
+    assert game.release_ordinal is None
+
+    game.release_date = "Oct 21, 2008"
+    assert game.release_ordinal == datetime.date(2008, 10, 21).toordinal()
+    assert year_ordinal_range(2008)[0] <= game.release_ordinal < year_ordinal_range(2008)[1]
+
+    with pytest.raises(ValueError):
+        game.release_date = "2008-10-21"
+    assert game.release_ordinal == datetime.date(2008, 10, 21).toordinal()
+
+
+def test_game_is_slotted():
+    game = Game(1, "Slotted game")
+    # The instance dict is only there for SQLAlchemy and stays empty outside of a session
+    assert game.__dict__ == {}
+    assert not hasattr(game, '_Game__reviews')
+
+    user = User("Shyamli", "pw12345")
+    game.add_review(Review(user, game, 4, "Good"))
+    assert len(game.reviews) == 1
+    assert game.__dict__ == {}
+
+
+def test_game_rating_aggregates():
+    game = Game(1, "Rated game")
+    assert (game.review_count, game.rating_sum, game.average_rating) == (0, 0, None)
+
+    game.record_rating(4)
+    game.record_rating(1)
+    assert (game.review_count, game.rating_sum, game.average_rating) == (2, 5, 2.5)
+
+
 def test_game_add_remove_genre():
     game1 = Game(1, "Super Soccer Blast")
     genre1 = Genre("Adventure")
@@ -371,6 +410,21 @@ def wishlist(user):
     return Wishlist(user)
 
 
+def test_intern_registry():
+    registry = InternRegistry()
+    action = registry.genre("Action")
+    assert registry.genre(" Action ") is action
+    assert registry.genre("Adventure") is not action
+    assert registry.publisher("Valve") is registry.publisher("Valve")
+
+    game = Game(1, "Copy")
+    game.publisher = Publisher("Valve")
+    game.add_genre(Genre("Action"))
+    registry.intern_game(game)
+    assert game.publisher is registry.publisher("Valve")
+    assert game.genres[0] is action
+
+
 def test_wishlist_initialization(wishlist):
     assert len(wishlist.list_of_games()) == 0
 
@@ -411,6 +465,35 @@ def test_wishlist_iter(wishlist, game):
     assert next(wishlist_iterator) == game
 
 
+def test_wishlist_membership_keeps_insertion_order(wishlist):
+    games = [Game(game_id, f"Game {game_id}") for game_id in (5, 3, 9, 1)]
+    for game in games + games:
+        wishlist.add_game(game)
+
+    assert len(wishlist) == 4
+    assert Game(9, "Same id") in wishlist
+    assert wishlist.list_of_games() == games
+    assert wishlist.select_game(2) is games[2]
+
+    wishlist.remove_game(Game(3, "Same id"))
+    assert list(wishlist) == [games[0], games[2], games[3]]
+    assert wishlist.first_game_in_list() is games[0]
+
+
+def test_ordered_set():
+    items = OrderedSet(["b", "a", "b"])
+    items.add("c")
+    items.add("a")
+    assert list(items) == ["b", "a", "c"]
+    assert "a" in items and len(items) == 3
+
+    items.discard("a")
+    items.discard("missing")
+    assert list(items) == ["b", "c"]
+    with pytest.raises(KeyError):
+        items.remove("missing")
+
+
 # Unit tests for CSVReader
 def create_csv_reader():
     dir_name = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -462,3 +545,106 @@ def test_genres_dataset():
     sorted_genres = sorted(genres_set)
     sorted_genre_sample = str(sorted_genres[:3])
     assert sorted_genre_sample == "[<Genre Action>, <Genre Adventure>, <Genre Animation & Modeling>]"
+
+
+def test_csv_reader_iter_game_batches():
+    dir_name = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    reader = GameFileCSVReader(os.path.join(dir_name, "games/adapters/data/games.csv"))
+
+    batches = list(reader.iter_game_batches(batch_size=100))
+    assert [len(batch) for batch in batches] == [100] * 8 + [77]
+    assert batches[0][0].game_id == 7940
+
+    # Games are handed out rather than kept, publishers and genres are still collected
+    assert reader.dataset_of_games == []
+    assert len(reader.dataset_of_publishers) == 798
+    assert len(reader.dataset_of_genres) == 24
+
+
+def test_split_csv_records_keeps_quoted_newlines_together(tmp_path):
+    csv_file = tmp_path / "games.csv"
+    csv_file.write_text('AppID,Name\n1,"Multi\nline, title"\n2,Plain\n3,"Say ""hi""\n again"\n', encoding='utf-8')
+
+    for parts in range(1, 8):
+        fieldnames, ranges = split_csv_records(str(csv_file), parts)
+        assert fieldnames == ["AppID", "Name"]
+        rows = [row for byte_range in ranges for row in read_rows(csv_file, fieldnames, byte_range)]
+        assert rows == [["1", "Multi\nline, title"], ["2", "Plain"], ["3", 'Say "hi"\n again']]
+
+
+def read_rows(csv_file, fieldnames, byte_range):
+    start, end = byte_range
+    with open(csv_file, 'rb') as file:
+        file.seek(start)
+        text = file.read(end - start).decode('utf-8')
+    return [row for row in csv.reader(io.StringIO(text))]
+
+
+def test_csv_reader_parallel_matches_sequential():
+    sequential = create_csv_reader()
+
+    dir_name = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    parallel = GameFileCSVReader(os.path.join(dir_name, "games/adapters/data/games.csv"))
+    parallel.read_csv_file_parallel(processes=2)
+
+    assert parallel.dataset_of_games == sequential.dataset_of_games
+    assert [game.title for game in parallel.dataset_of_games] == [game.title for game in sequential.dataset_of_games]
+    assert parallel.dataset_of_publishers == sequential.dataset_of_publishers
+    assert parallel.dataset_of_genres == sequential.dataset_of_genres
+
+    # Genres parsed in different processes end up as one instance per name
+    for reader in (sequential, parallel):
+        action_genres = {id(genre) for game in reader.dataset_of_games for genre in game.genres if genre.genre_name == "Action"}
+        assert len(action_genres) == 1
+
+
+def test_csv_reader_lazy_details_match_eager_reader():
+    eager = create_csv_reader()
+
+    dir_name = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    lazy = GameFileCSVReader(os.path.join(dir_name, "games/adapters/data/games.csv"), lazy_details=True)
+    lazy.read_csv_file()
+
+    assert lazy.dataset_of_games == eager.dataset_of_games
+    for lazy_game, eager_game in zip(lazy.dataset_of_games, eager.dataset_of_games):
+        assert lazy_game.title == eager_game.title
+        assert lazy_game.image_url == eager_game.image_url
+        assert lazy_game.description == eager_game.description
+
+
+def test_game_details_loader():
+    calls = []
+    game = Game(1, "Lazy game")
+    game.set_details_loader(lambda game_id, field: calls.append((game_id, field)) or f"{field} of {game_id}")
+
+    assert calls == []
+    assert game.description == "description of 1"
+    assert game.image_url == "image_url of 1"
+    assert calls == [(1, 'description'), (1, 'image_url')]
+
+    # A value set on the game wins over the loader
+    game.description = "Set directly"
+    assert game.description == "Set directly"
+    assert game.image_url == "image_url of 1"
+
+
+def test_csv_record_store_caches_recent_details(tmp_path):
+    csv_file = tmp_path / "games.csv"
+    csv_file.write_text('AppID,About the game,Screenshots\n1,"First\ngame",one.jpg\n2,Second,\n3,Third,three.jpg\n',
+                        encoding='utf-8')
+    offsets = {1: 33, 2: 56, 3: 66}
+    store = CSVRecordStore(str(csv_file), ["AppID", "About the game", "Screenshots"], cache_size=2)
+    for game_id, offset in offsets.items():
+        store.add(game_id, offset)
+
+    assert store.read_detail(1, 'description') == "First\ngame"
+    assert store.read_detail(1, 'image_url') == "one.jpg"
+    assert store.read_detail(2, 'image_url') is None
+    assert store.read_detail(3, 'description') == "Third"
+    assert store.read_detail(4, 'description') is None
+
+    # Only the two most recently read games stay cached, and pickling drops the cache
+    copy = pickle.loads(pickle.dumps(store))
+    assert len(store._CSVRecordStore__cache) == 2
+    assert len(copy._CSVRecordStore__cache) == 0
+    assert copy.read_detail(1, 'description') == "First\ngame"
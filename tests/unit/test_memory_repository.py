@@ -1,6 +1,6 @@
 import pytest
 from games.adapters.memory_repository import MemoryRepository, populate2 as populate
-from games.domainmodel.model import Game, Publisher, User
+from games.domainmodel.model import Game, Genre, Publisher, User
 
 
 def test_populate_function():
@@ -102,3 +102,38 @@ def test_inserting_non_existing_search_key_throws_exception(memory_repo):
 def test_getting_games_for_price(memory_repo):
     results = memory_repo.search_games('a', 'Title', ["40-70"])
     assert results != []
+
+
+def test_get_game_by_id(memory_repo):
+    game = memory_repo.get_games()[0]
+    assert memory_repo.get_game_by_id(game.game_id) is game
+
+    # Unknown id
+    assert memory_repo.get_game_by_id(-1) is None
+
+    # Games added afterwards are indexed as well
+    new_game = Game(99999999, "Test Game")
+    memory_repo.add_game(new_game)
+    assert memory_repo.get_game_by_id(99999999) is new_game
+
+
+def test_add_multiple_games(memory_repo):
+    new_game1 = Game(99999998, "Test Game 1")
+    new_game2 = Game(99999999, "Test Game 2")
+    memory_repo.add_multiple_games([new_game1, new_game2])
+
+    assert memory_repo.get_number_of_games() == 879
+    assert memory_repo.get_game_by_id(99999998) is new_game1
+    assert memory_repo.get_game_by_id(99999999) is new_game2
+
+
+def test_add_game_shares_genre_and_publisher_instances(memory_repo):
+    action_game = next(game for game in memory_repo.get_games() if Genre("Action") in game.genres)
+
+    new_game = Game(99999999, "Test Game")
+    new_game.publisher = Publisher(action_game.publisher.publisher_name)
+    new_game.add_genre(Genre("Action"))
+    memory_repo.add_game(new_game)
+
+    assert new_game.publisher is action_game.publisher
+    assert new_game.genres[0] is next(genre for genre in action_game.genres if genre == Genre("Action"))
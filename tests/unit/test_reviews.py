@@ -135,3 +135,21 @@ def test_add_review_without_user_or_game(memory_repo, user, game):
     with pytest.raises(ValueError):
         review = Review(user=user, game=None, rating=4, comment="No game")
         memory_repo.add_review(review)
+
+
+def test_add_review_keeps_rating_aggregates(user):
+    memory_repo = MemoryRepository()
+    games = [Game(game_id, f"Game {game_id}") for game_id in (1, 2, 3)]
+    for game in games:
+        memory_repo.add_game(game)
+    assert calculate_average_rating(memory_repo, 1, []) == 0.0
+    assert [row["game_id"] for row in memory_repo.get_games_pagination(order_by='rating')] == [1, 2, 3]
+
+    for game, rating in ((games[0], 2), (games[1], 5), (games[0], 3)):
+        memory_repo.add_review(Review(user=user, game=game, rating=rating, comment=""))
+
+    assert (games[0].review_count, games[0].rating_sum) == (2, 5)
+    assert calculate_average_rating(memory_repo, 1, []) == 2.5
+    assert calculate_average_rating(memory_repo, 2, []) == 5
+    # Highest average first, unrated games last
+    assert [row["game_id"] for row in memory_repo.get_games_pagination(order_by='rating')] == [2, 1, 3]
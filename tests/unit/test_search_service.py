@@ -1,3 +1,5 @@
+import random
+
 import pytest
 from unittest.mock import Mock
 
@@ -5,6 +7,8 @@ from games import MemoryRepository
 from games.adapters.repository import AbstractRepository
 from games.domainmodel.model import Game, Genre, Publisher
 import games.adapters.repository as repo
+from games.adapters.repository import parse_price_ranges
+from games.adapters.memory_repository import populate2 as populate
 
 
 # @pytest.fixture
@@ -74,6 +78,83 @@ def test_getting_games_for_price(memory_repo):
     results = memory_repo.search_games('a', 'Title', ["40-70"])
     assert len(results) == 1
 
+
+def test_search_title_substring_across_words(memory_repo):
+    results = memory_repo.search_games('me 2', 'Title', [])
+    assert [game.game_id for game in results] == [2]
+
+
+def test_search_is_case_insensitive(memory_repo):
+    assert len(memory_repo.search_games('game', 'Title', [])) == 3
+    assert len(memory_repo.search_games('adventure', 'Genre', [])) == 2
+    assert len(memory_repo.search_games('me', 'Publisher', [])) == 3
+
+
+def test_search_results_sorted_by_id(memory_repo):
+    results = memory_repo.search_games('Game', 'Title', [])
+    assert [game.game_id for game in results] == [1, 2, 3]
+
+
+def test_search_genre_requires_whole_name(memory_repo):
+    assert memory_repo.search_games('Adv', 'Genre', []) == []
+
+
+def test_search_index_updated_on_add_game(memory_repo):
+    game4 = Game(4, "Brand New Title")
+    game4.publisher = Publisher("Someone Else")
+    memory_repo.add_game(game4)
+
+    assert memory_repo.search_games('new tit', 'Title', []) == [game4]
+    assert memory_repo.search_games('else', 'Publisher', []) == [game4]
+
+
+
+def test_search_overlapping_price_ranges_return_each_game_once(memory_repo):
+    results = memory_repo.search_games('Game', 'Title', ["0-50", "40-70", "5-5"])
+    assert [game.game_id for game in results] == [2, 3]
+
+    # Bounds are inclusive, and games in any of the ranges are returned
+    results = memory_repo.search_games('me', 'Publisher', ["45-45", "500-600"])
+    assert [game.game_id for game in results] == [1, 3]
+
+
+def test_search_price_ranges_match_a_scan_of_all_games():
+    repo = MemoryRepository()
+    populate(repo)
+    price_filter = ["0-15", "10-30", "51-75"]
+
+    results = repo.search_games('', 'Title', price_filter)
+    expected = [game for game in repo.get_games()
+                if any(low <= game.price <= high for low, high in ((0, 15), (10, 30), (51, 75)))]
+    assert results == expected
+    assert parse_price_ranges(price_filter) == [(0, 30), (51, 75)]
+
+
+def test_search_price_ranges_after_shuffled_load():
+    rng = random.Random(19)
+    games = []
+    for game_id in range(1, 5001):
+        game = Game(game_id, f"Game {game_id}")
+        game.price = rng.choice([0, 0.99, 4.99, 9.99, 19.99, rng.randint(0, 8000) / 100])
+        games.append(game)
+    rng.shuffle(games)
+
+    repo = MemoryRepository()
+    # Searched half way through, so games added after a lookup are sorted in as well
+    for game in games[:2500]:
+        repo.add_game(game)
+    repo.search_games('', 'Title', ["0-10"])
+    for game in games[2500:]:
+        repo.add_game(game)
+
+    ranges = ((0, 5), (10, 20), (60, 80))
+    results = repo.search_games('', 'Title', [f"{low}-{high}" for low, high in ranges])
+    expected = sorted((game for game in games if any(low <= game.price <= high for low, high in ranges)),
+                      key=lambda game: game.game_id)
+    assert results == expected
+    assert repo.search_games('', 'Title', ["0-0"]) == [game for game in expected if game.price == 0]
+
+
 if __name__ == "__main__":
     pytest.main()
 
@@ -1,10 +1,11 @@
 import pytest
 
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, clear_mappers
+from sqlalchemy.orm import sessionmaker
 
+from games import create_app
 from games.adapters import database_repository, repository_populate
-from games.adapters.orm import metadata, map_model_to_tables
+from games.adapters.orm import metadata, map_model_to_tables, unmap_model
 
 from games.domainmodel.model import User, Game
 import datetime
@@ -22,7 +23,7 @@ TEST_DATABASE_URI_FILE = 'sqlite:///games-test.db'
 
 @pytest.fixture
 def database_engine():
-    clear_mappers()
+    unmap_model()
     engine = create_engine(TEST_DATABASE_URI_FILE)
     metadata.create_all(engine)  # Conditionally create database tables.
     with engine.connect() as e:
@@ -37,12 +38,13 @@ def database_engine():
     repository_populate.populate(TEST_DATA_PATH_DATABASE_LIMITED, repo_instance, database_mode)
     yield engine
     metadata.drop_all(engine)
+    unmap_model()
 
 
 # Engine is different
 @pytest.fixture
 def session_factory():
-    clear_mappers()
+    unmap_model()
     engine = create_engine(TEST_DATABASE_URI_IN_MEMORY)
     metadata.create_all(engine)
     with engine.connect() as e:
@@ -67,11 +69,12 @@ def session_factory():
 
     yield session_factory
     metadata.drop_all(engine)
+    unmap_model()
 
 
 @pytest.fixture
 def empty_session():
-    clear_mappers()
+    unmap_model()
     engine = create_engine(TEST_DATABASE_URI_IN_MEMORY)
     metadata.create_all(engine)
     with engine.connect() as e:
@@ -80,4 +83,19 @@ def empty_session():
     map_model_to_tables()
     session_factory = sessionmaker(bind=engine)
     yield session_factory()
-    metadata.drop_all(engine)
\ No newline at end of file
+    metadata.drop_all(engine)
+    unmap_model()
+
+
+@pytest.fixture
+def database_client():
+    my_app = create_app({
+        'TESTING': True,
+        'TEST_DATA_PATH': TEST_DATA_PATH_DATABASE_LIMITED,
+        'WTF_CSRF_ENABLED': False,
+        'REPOSITORY': 'database',
+        'SQLALCHEMY_DATABASE_URI': TEST_DATABASE_URI_IN_MEMORY,
+        'SQLALCHEMY_POOL': 'static',                    # In-memory SQLite only lives on one connection.
+    })
+    yield my_app.test_client()
+    unmap_model()
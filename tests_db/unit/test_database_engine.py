@@ -0,0 +1,40 @@
+import pytest
+
+from sqlalchemy import text
+from sqlalchemy.pool import NullPool, QueuePool, StaticPool
+
+from games.adapters.database_engine import create_database_engine
+
+
+def test_create_database_engine_pool_modes():
+    assert isinstance(create_database_engine('sqlite://', pool='static').pool, StaticPool)
+    assert isinstance(create_database_engine('sqlite://', pool='null').pool, NullPool)
+
+    engine = create_database_engine('sqlite://', pool='queue', pool_size=3, max_overflow=2)
+    assert isinstance(engine.pool, QueuePool)
+    assert engine.pool.size() == 3
+
+
+def test_create_database_engine_unknown_pool():
+    with pytest.raises(ValueError):
+        create_database_engine('sqlite://', pool='bogus')
+
+
+def test_queue_pool_reuses_connections(tmp_path):
+    engine = create_database_engine(f"sqlite:///{tmp_path / 'pool.db'}", pool='queue', pool_size=1)
+
+    with engine.connect() as conn:
+        first = conn.connection.dbapi_connection
+    with engine.connect() as conn:
+        second = conn.connection.dbapi_connection
+
+    assert first is second
+
+
+def test_sqlite_pragmas_applied_on_connect(tmp_path):
+    engine = create_database_engine(f"sqlite:///{tmp_path / 'pragmas.db'}")
+
+    with engine.connect() as conn:
+        assert conn.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert conn.execute(text('PRAGMA synchronous')).scalar() == 1  # NORMAL
+        assert conn.execute(text('PRAGMA busy_timeout')).scalar() == 5000
@@ -1,6 +1,9 @@
 
 import datetime
 
+from sqlalchemy import event
+
+import games.adapters.repository as repository
 from games.adapters.database_repository import SqlAlchemyRepository
 from games.domainmodel.model import Game, Publisher, User, Wishlist, Review, Genre, add_review
 from games.adapters.repository import RepositoryException
@@ -616,3 +619,224 @@ def test_repository_search_games_by_release_year(session_factory):
     # Then the correct game(s) should be returned
     assert len(games) == 176
     assert "2021" in games[0].release_date
+
+
+def test_repository_search_games_overlapping_price_ranges(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+
+    merged = repo.search_games("", "Title", ["0-30"])
+    overlapping = repo.search_games("", "Title", ["0-15", "10-30", "20-25"])
+    assert len(merged) > 0
+    assert [game.game_id for game in overlapping] == [game.game_id for game in merged]
+    assert all(0 <= game.price <= 30 for game in overlapping)
+
+
+def test_repository_get_games_pagination_by_release_date(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+
+    games = repo.get_games_pagination("All", 0, 877, 'release_date')
+    dates = [datetime.datetime.strptime(game['release_date'], "%b %d, %Y") for game in games]
+    assert len(games) == 877
+    assert dates == sorted(dates)
+
+
+def test_repository_get_games_page_matches_offset_pages(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+
+    for genre, order_by in (("All", 'title'), ("All", 'release_date'), ("Action", 'title')):
+        offset_games = repo.get_games_pagination(genre, 0, 1000, order_by)
+        pages = (len(offset_games) + 9) // 10
+        # Jumping deep first walks the listing from the start, later pages seek from remembered boundaries
+        for page in [pages, 25, 24, 1, 2] + list(range(3, pages + 1)):
+            if page > pages:
+                continue
+            assert repo.get_games_page(genre, page, 10, order_by) == offset_games[(page - 1) * 10:page * 10]
+        assert repo.get_games_page(genre, pages + 1, 10, order_by) == []
+
+
+def test_repository_get_games_page_refreshed_on_add_game(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+
+    assert repo.get_games_page("All", 30, 10, 'title')
+    game = Game(1005, "!!! First Game")
+    game.price = 1.99
+    game.release_date = "Oct 21, 2008"
+    game.publisher = Publisher("Mystery Works")
+    repo.add_game(game)
+    assert repo.get_games_page("All", 1, 10, 'title')[0]["game_id"] == 1005
+    assert repo.get_games_page("All", 30, 10, 'title') == repo.get_games_pagination("All", 290, 10, 'title')
+
+
+def test_repository_game_pages_do_not_load_games(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    loaded = []
+
+    def on_load(game, context):
+        loaded.append(game)
+
+    event.listen(Game, 'load', on_load)
+    try:
+        page = repo.get_games_pagination("Action", 0, 10, 'release_date')
+        assert repo.get_games_page("Action", 3, 10, 'title') == repo.get_games_pagination("Action", 20, 10, 'title')
+    finally:
+        event.remove(Game, 'load', on_load)
+
+    assert len(page) == 10
+    assert all(set(row) == {"game_id", "title", "release_date"} for row in page)
+    assert loaded == []
+
+
+def count_queries(engine, action) -> int:
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', on_execute)
+    try:
+        action()
+    finally:
+        event.remove(engine, 'before_cursor_execute', on_execute)
+    return len(statements)
+
+
+def test_repository_game_and_profile_pages_load_in_bounded_queries(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    engine = session_factory.kw['bind']
+    usernames = [f"reviewer{index}" for index in range(5)]
+    users = [User(username, "Password123") for username in usernames]
+    for user in users:
+        repo.add_user(user)
+    games = [repo.get_game_by_id(game_id) for game_id in (7940, 1228870, 311120, 410320, 418650)]
+    for user in users:
+        for game in games:
+            repo.add_review(add_review("Good game", 4, game, user))
+        repo.add_to_user_favorite(user, games[0])
+        repo.add_to_user_wishlist(user, games[1])
+    repo.reset_session()
+
+    def show_game():
+        # What game_description.html reads
+        game = repo.get_game_detail(7940)
+        assert game.publisher.publisher_name
+        assert [genre.genre_name for genre in game.genres]
+        assert sorted(review.user.username for review in game.reviews) == usernames
+
+    def show_profile():
+        # What profile.html reads
+        user = repo.get_user_profile("reviewer0")
+        assert len(user.reviews) == 5 and all(review.game.title for review in user.reviews)
+        assert [game.title for game in user.favourite_games]
+        assert [game.title for game in repo.get_wishlist(user)]
+
+    # One query per loading step, whatever the number of reviews, genres or games
+    assert count_queries(engine, show_game) <= 3
+    repo.reset_session()
+    assert count_queries(engine, show_profile) <= 4
+    assert repo.get_game_detail(-1) is None
+    assert repo.get_user_profile("nobody") is None
+
+
+def test_repository_add_review_keeps_rating_aggregates(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    user = User("critic", "Password123")
+    repo.add_user(user)
+    assert repo.calculate_average_rating(7940, []) == 0.0
+
+    for game_id, rating in ((7940, 2), (1228870, 5), (7940, 3), (7940, 5)):
+        repo.add_review(add_review("", rating, repo.get_game_by_id(game_id), repo.get_user("critic")))
+    repo.reset_session()
+
+    game = repo.get_game_by_id(7940)
+    assert (game.review_count, game.rating_sum) == (3, 10)
+    assert repo.calculate_average_rating(7940, []) == 3.3
+    assert repo.calculate_average_rating(1228870, []) == 5.0
+    # Highest average first, unrated games last
+    rows = repo.get_games_page("All", 1, 3, 'rating')
+    assert [row["game_id"] for row in rows[:2]] == [1228870, 7940]
+    assert repo.get_games_pagination("All", 0, 1000, 'rating')[2:] == \
+        [row for row in repo.get_games_pagination("All", 0, 1000, 'game_id') if row["game_id"] not in (7940, 1228870)]
+
+
+def test_repository_get_number_of_games_by_genre(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+
+    for genre in ("All", "Action", "Indie", "No Such Genre"):
+        assert repo.get_number_of_games_by_genre(genre) == len(repo.get_games_by_genre(genre))
+
+    # Counts are cached until a game is added
+    action_games = repo.get_number_of_games_by_genre("Action")
+    all_games = repo.get_number_of_games_by_genre("All")
+    game = Game(1006, "Counted Game")
+    game.price = 1.99
+    game.release_date = "Oct 21, 2008"
+    game.publisher = Publisher("Mystery Works")
+    game.add_genre(Genre("Action"))
+    repo.add_game(game)
+    assert repo.get_number_of_games_by_genre("Action") == action_games + 1
+    assert repo.get_number_of_games_by_genre("All") == all_games + 1
+
+
+def test_repository_get_game_genres_refreshed_on_add_genre(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+
+    genres = repo.get_game_genres()
+    assert genres == sorted(genres)
+    assert "Zzz Genre" not in genres
+
+    repo.add_multiple_genres([Genre("Zzz Genre")])
+    assert repo.get_game_genres()[-1] == "Zzz Genre"
+
+
+def test_repository_search_games_full_text_matches_substrings(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+
+    game = Game(1004, "Unbelievable Quest")
+    game.publisher = Publisher("Mystery Works")
+    game.release_date = datetime.date(2019, 4, 2).strftime("%b %d, %Y")
+    game.price = 3.50
+    repo.add_game(game)
+
+    # Text inside a word and in a different case is still found
+    assert [g.game_id for g in repo.search_games("BELIEVABLE", "Title", [])] == [1004]
+    assert [g.game_id for g in repo.search_games("stery wor", "Publisher", [])] == [1004]
+    assert [g.game_id for g in repo.search_games_by_title("able qu")] == [1004]
+
+
+def test_repository_search_games_full_text_agrees_with_like(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+
+    games = repo.search_games("Zombie", "Title", [])
+    like_games = [game for game in repo.get_games() if "zombie" in game.title.lower()]
+    assert len(games) > 1
+    assert sorted(games) == sorted(like_games)
+
+
+def test_repository_search_games_short_query_uses_like(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+
+    games = repo.search_games("Zo", "Title", [])
+    assert sorted(games) == sorted(game for game in repo.get_games() if "zo" in game.title.lower())
+
+
+def test_repository_reset_session_starts_with_empty_identity_map(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+
+    game = repo.get_game(5121)
+    assert game in repo._session_cm.session
+
+    repo.reset_session()
+    assert game not in repo._session_cm.session
+
+    # The game is loaded again by the new session
+    reloaded_game = repo.get_game(5121)
+    assert reloaded_game == game
+    assert reloaded_game is not game
+
+
+def test_requests_do_not_share_session_state(database_client):
+    response = database_client.get('/Call_of_Duty/7940')
+    assert response.status_code == 200
+
+    # Teardown closed and discarded the request's session, the next request starts a new one
+    assert not repository.repo_instance._session_cm.session.registry.has()
@@ -2,9 +2,12 @@ import pytest
 
 import datetime
 
-from sqlalchemy import text
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.exc import IntegrityError
 
+from games.adapters.orm import (
+    add_rating_aggregate_columns, add_release_ordinal_column, create_missing_indexes, map_model_to_tables, unmap_model
+)
 from games.domainmodel.model import Game, Review, User, Genre, Publisher, add_review
 
 
@@ -304,3 +307,88 @@ def test_saving_of_game_to_favourite_games(empty_session):
     assert rows == [(user_key, game_key)]
     assert empty_session.query(User).get(rows[0][0]) == empty_session.query(User).filter(User._User__username == "Herobrine").one()
     assert empty_session.query(Game).get(rows[0][1]) == empty_session.query(Game).filter(Game._Game__game_title == "Minecraft").one()
+
+
+def test_games_full_text_index_follows_game_writes(empty_session):
+    insert_game_publisher_association(empty_session)
+
+    def matching_ids(match):
+        rows = empty_session.execute(text('SELECT rowid FROM games_fts WHERE games_fts MATCH :match ORDER BY rowid'),
+                                     {'match': match}).all()
+        return [row[0] for row in rows]
+
+    assert matching_ids('{game_title} : "craft"') == [1234, 2345]
+    assert matching_ids('{publisher_name} : "mojang"') == [1234, 2345]
+
+    empty_session.execute(text('UPDATE games SET game_title = "Terraria" WHERE game_id = 1234'))
+    assert matching_ids('{game_title} : "craft"') == [2345]
+    assert matching_ids('{game_title} : "terra"') == [1234]
+
+    empty_session.execute(text('DELETE FROM games WHERE game_id = 2345'))
+    assert matching_ids('{game_title} : "craft"') == []
+
+
+def test_upgrade_existing_database():
+    engine = create_engine('sqlite://')
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE games (game_id INTEGER PRIMARY KEY, game_title TEXT, release_date VARCHAR(50))")
+        connection.exec_driver_sql(
+            "INSERT INTO games VALUES (1, 'Old', 'Oct 21, 2008'), (2, 'Newer', 'Jan 01, 2021')")
+
+        add_release_ordinal_column(connection)
+        # Running it again is a no-op
+        add_release_ordinal_column(connection)
+        connection.exec_driver_sql("ALTER TABLE games ADD COLUMN game_price FLOAT")
+        connection.exec_driver_sql("CREATE TABLE reviews (review_id INTEGER PRIMARY KEY, rating INTEGER, game_id INTEGER)")
+        connection.exec_driver_sql("INSERT INTO reviews VALUES (1, 4, 1), (2, 1, 1), (3, 5, 2)")
+        add_rating_aggregate_columns(connection)
+        add_rating_aggregate_columns(connection)
+
+        # Indexes on columns or tables the database does not have are left out
+        created = create_missing_indexes(connection)
+        assert sorted(created) == ['ix_games_game_price', 'ix_games_game_title', 'ix_games_release_ordinal',
+                                   'ix_reviews_game_id_rating']
+        assert create_missing_indexes(connection) == []
+
+        rows = connection.exec_driver_sql("SELECT game_id, release_ordinal FROM games ORDER BY game_id").all()
+        assert rows == [(1, datetime.date(2008, 10, 21).toordinal()), (2, datetime.date(2021, 1, 1).toordinal())]
+        rows = connection.exec_driver_sql("SELECT game_id, review_count, rating_sum FROM games ORDER BY game_id").all()
+        assert rows == [(1, 2, 5), (2, 1, 5)]
+        index_names = [index['name'] for index in inspect(connection).get_indexes('games')]
+        assert 'ix_games_release_ordinal' in index_names
+        assert 'ix_games_game_price' in index_names
+
+
+def test_browse_and_rating_queries_use_indexes(empty_session):
+    def query_plan(sql):
+        rows = empty_session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+        return " | ".join(row[-1] for row in rows)
+
+    plan = query_plan("SELECT game_id FROM game_genres WHERE genre_name = 'Action'")
+    assert "COVERING INDEX ix_game_genres_genre_name_game_id" in plan
+
+    plan = query_plan("SELECT genre_name FROM game_genres WHERE game_id = 7940")
+    assert "COVERING INDEX ix_game_genres_game_id_genre_name" in plan
+
+    plan = query_plan("SELECT avg(rating) FROM reviews WHERE game_id = 7940")
+    assert "COVERING INDEX ix_reviews_game_id_rating" in plan
+
+    plan = query_plan("SELECT review_id FROM reviews WHERE user_id = 1")
+    assert "INDEX ix_reviews_user_id" in plan
+
+    plan = query_plan("SELECT game_id FROM games ORDER BY game_title LIMIT 10")
+    assert "ix_games_game_title" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_unmapping_restores_slotted_classes():
+    unmap_model()
+    map_model_to_tables()
+    assert Game(1, "Mapped").__dict__ != {}
+    unmap_model()
+
+    game = Game(1, "Unmapped")
+    user = User("Slotted", "Password123")
+    assert game.__dict__ == {} and user.__dict__ == {}
+    assert game.title == "Unmapped" and user.username == "Slotted"
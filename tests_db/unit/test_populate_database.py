@@ -1,7 +1,14 @@
+from pathlib import Path
+
 from sqlalchemy import select, inspect
+from sqlalchemy.orm import sessionmaker
 
+from games.adapters import repository_populate
+from games.adapters.database_repository import SqlAlchemyRepository
 from games.adapters.orm import metadata
 
+TEST_DATA_PATH_DATABASE_LIMITED = Path(__file__).parent.parent.parent / "tests" / "data"
+
 # Using data from ../tests/data/games.csv
 
 
@@ -12,6 +19,11 @@ def test_database_populate_inspect_table_names(database_engine):
     assert inspector.get_table_names() == [
         'game_genres',
         'games',
+        'games_fts',
+        'games_fts_config',
+        'games_fts_data',
+        'games_fts_docsize',
+        'games_fts_idx',
         'genres',
         'publishers',
         'reviews',
@@ -23,9 +35,7 @@ def test_database_populate_inspect_table_names(database_engine):
 
 def test_database_populate_select_all_games(database_engine):
 
-    # Get table information
-    inspector = inspect(database_engine)
-    name_of_games_table = inspector.get_table_names()[1]
+    name_of_games_table = 'games'
 
     with database_engine.connect() as connection:
         # query for records in table users
@@ -54,9 +64,7 @@ def test_database_populate_select_all_games(database_engine):
 
 def test_database_populate_select_all_genres(database_engine):
 
-    # Get table information
-    inspector = inspect(database_engine)
-    name_of_genres_table = inspector.get_table_names()[2]
+    name_of_genres_table = 'genres'
 
     with database_engine.connect() as connection:
         # query for records in table genres
@@ -74,9 +82,7 @@ def test_database_populate_select_all_genres(database_engine):
 
 def test_database_populate_select_all_publishers(database_engine):
 
-    # Get table information
-    inspector = inspect(database_engine)
-    name_of_publishers_table = inspector.get_table_names()[3]
+    name_of_publishers_table = 'publishers'
 
     with database_engine.connect() as connection:
         # query for records in table publishers
@@ -100,3 +106,33 @@ def test_database_populate_select_all_publishers(database_engine):
 
         for p in select_publishers:
             assert p in all_publishers
+
+
+def test_database_populate_bulk_load_reports_progress(empty_session):
+    repo = SqlAlchemyRepository(sessionmaker(bind=empty_session.get_bind()))
+
+    calls = []
+    stats = repository_populate.populate(TEST_DATA_PATH_DATABASE_LIMITED, repo, True,
+                                         progress=lambda table, done: calls.append((table, done)))
+
+    # 8 publishers, 1 genre, 8 games and 8 game/genre links
+    assert stats['rows'] == 25
+    assert stats['rows_per_second'] > 0
+    assert calls == [('publishers', 8), ('genres', 1), ('games', 8), ('game_genres', 8)]
+
+    assert repo.get_number_of_games() == 8
+    assert repo.get_game(7940).genres[0].genre_name == 'Action'
+
+
+def test_database_populate_streams_in_batches(empty_session):
+    repo = SqlAlchemyRepository(sessionmaker(bind=empty_session.get_bind()))
+
+    calls = []
+    stats = repository_populate.populate(TEST_DATA_PATH_DATABASE_LIMITED, repo, True, batch_size=3,
+                                         progress=lambda table, done: calls.append((table, done)))
+
+    assert stats['rows'] == 25
+    assert [done for table, done in calls if table == 'games'] == [3, 6, 8]
+    # The single genre is only inserted once, with the first batch
+    assert [done for table, done in calls if table == 'genres'] == [1]
+    assert repo.get_number_of_games() == 8